@@ -0,0 +1,128 @@
+"""
+Benchmark of the IRCv3 chat line parser
+
+Parses every line of one or more recorded chat logs, one raw IRC line per line, and reports messages per second for
+the eager parser this replaces and for twitch.ircparser. Each is measured parsing only, and parsing then reading the
+fields a typical handler reads: the command, channel, author, content and a few tags, and parsing then reading
+every tag.
+
+    python benchmarks/bench_chat_parser.py [corpus ...]
+
+Without arguments the bundled sample in benchmarks/data is used.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from twitch.ircparser import parse  # noqa: E402
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'chat_sample.txt')
+ESCAPES = {':': ';', 's': ' ', '\\': '\\', 'r': '\r', 'n': '\n'}
+
+
+def eager_unescape(value):
+    # The character by character unescape this replaces, kept for comparison
+    if '\\' not in value:
+        return value
+
+    ret = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            escaped = next(chars, '')
+            ret.append(ESCAPES.get(escaped, escaped))
+        else:
+            ret.append(char)
+
+    return ''.join(ret)
+
+
+def eager_parse(line):
+    # The parser this replaces, splitting and unescaping every tag of every line up front
+    tags = {}
+    prefix = None
+
+    if line.startswith('@'):
+        raw_tags, _, line = line[1:].partition(' ')
+        for tag in raw_tags.split(';'):
+            key, _, value = tag.partition('=')
+            tags[key] = eager_unescape(value)
+
+    if line.startswith(':'):
+        prefix, _, line = line[1:].partition(' ')
+
+    line, separator, trailing = line.partition(' :')
+    params = line.split()
+    command = params.pop(0) if params else ''
+
+    if separator:
+        params.append(trailing)
+
+    return tags, prefix, command, params
+
+
+def eager_handle(line):
+    tags, prefix, command, params = eager_parse(line)
+
+    if command == 'PRIVMSG':
+        return (params[0][1:], prefix.partition('!')[0], params[-1], tags.get('display-name'), tags.get('user-id'),
+                tags.get('mod'), tags.get('badges'))
+    return command
+
+
+def lazy_handle(line):
+    message = parse(line)
+
+    if message.command == 'PRIVMSG':
+        tags = message.tags
+        return (message.channel, message.nick, message.trailing, tags.get('display-name'), tags.get('user-id'),
+                tags.get('mod'), tags.get('badges'))
+    return message.command
+
+
+def eager_all_tags(line):
+    return dict(eager_parse(line)[0])
+
+
+def lazy_all_tags(line):
+    return dict(parse(line).tags)
+
+
+def measure(func, lines, min_time=1.0):
+    # Repeat the corpus until at least min_time seconds were spent, report the best pass
+    best = None
+    spent = 0.0
+
+    while spent < min_time or best is None:
+        started = time.perf_counter()
+        for line in lines:
+            func(line)
+        elapsed = time.perf_counter() - started
+
+        spent += elapsed
+        best = elapsed if best is None else min(best, elapsed)
+
+    return len(lines) / best
+
+
+def main():
+    paths = sys.argv[1:] or [SAMPLE]
+    lines = []
+
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            lines.extend(line.rstrip('\r\n') for line in f if line.strip())
+
+    print(f'{len(lines)} messages from {len(paths)} corpus file(s)')
+    print(f'{"parser":>10} {"parse msg/s":>14} {"handle msg/s":>14} {"all tags msg/s":>16}')
+
+    for name, funcs in (('eager', (eager_parse, eager_handle, eager_all_tags)),
+                        ('lazy', (parse, lazy_handle, lazy_all_tags))):
+        parser, handler, all_tags = (measure(func, lines) for func in funcs)
+        print(f'{name:>10} {parser:>14,.0f} {handler:>14,.0f} {all_tags:>16,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark of the chat transports
+
+Starts a local stand-in for twitch chat in a separate process, serving the same IRC lines over a WebSocket and over
+a plain TCP socket, and has a ChatClient join a channel over each to receive them. Reports messages per second and
+the client's CPU time per message for WebSocketChatSocket and TCPChatSocket. Both run unencrypted, so only the
+framing differs, TLS adds the same cost to either.
+
+    python benchmarks/bench_chat_transport.py [--messages N] [--lines-per-frame N] [corpus ...]
+
+Without a corpus the bundled sample in benchmarks/data is used, repeated until N messages were sent.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from aiohttp import web  # noqa: E402
+
+from twitch.chat import ChatClient  # noqa: E402
+from twitch.irc import TCPChatSocket, WebSocketChatSocket  # noqa: E402
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'chat_sample.txt')
+WELCOME = ':tmi.twitch.tv 001 bench :Welcome, GLHF!'
+
+
+def load(paths, count):
+    lines = []
+
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            # PINGs are answered by the connection rather than counted as messages
+            lines.extend(line.rstrip('\r\n') for line in f if line.strip() and not line.startswith('PING'))
+
+    return [lines[i % len(lines)] for i in range(count)]
+
+
+def serve(lines, lines_per_frame, ports):
+    # The stand-in server, run in its own process so its CPU time is not counted against the client
+    frames = ['\r\n'.join(lines[i:i + lines_per_frame]) for i in range(0, len(lines), lines_per_frame)]
+    payload = ''.join(line + '\r\n' for line in lines).encode()
+
+    async def websocket(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        async for msg in ws:
+            if 'NICK ' in msg.data:
+                await ws.send_str(WELCOME)
+            elif 'JOIN ' in msg.data:
+                for frame in frames:
+                    await ws.send_str(frame)
+        return ws
+
+    async def tcp(reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            elif line.startswith(b'NICK '):
+                writer.write(WELCOME.encode() + b'\r\n')
+            elif line.startswith(b'JOIN '):
+                writer.write(payload)
+            await writer.drain()
+
+    async def main():
+        app = web.Application()
+        app.router.add_get('/', websocket)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+
+        server = await asyncio.start_server(tcp, '127.0.0.1', 0)
+        ports.put((runner.addresses[0][1], server.sockets[0].getsockname()[1]))
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+async def receive(socket_type, socket_options, count):
+    chat = ChatClient(socket_type=socket_type, socket_options=socket_options)
+    await chat.connect(timeout=10)
+    connection = chat.connection
+
+    started, cpu = time.perf_counter(), time.process_time()
+    await chat.join('bench')
+
+    while connection.messages < count:
+        await asyncio.sleep(0.005)
+
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu
+    await chat.close()
+    return count / elapsed, cpu / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('corpus', nargs='*', default=[SAMPLE])
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--lines-per-frame', type=int, default=1)
+    args = parser.parse_args()
+
+    lines = load(args.corpus, args.messages)
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(lines, args.lines_per_frame, ports), daemon=True)
+    server.start()
+
+    try:
+        ws_port, tcp_port = ports.get(timeout=10)
+        transports = (
+            ('websocket', WebSocketChatSocket, {'url': f'http://127.0.0.1:{ws_port}/'}),
+            ('tcp', TCPChatSocket, {'host': '127.0.0.1', 'port': tcp_port, 'ssl': False}),
+        )
+
+        print(f'{len(lines)} messages, {args.lines_per_frame} line(s) per WebSocket frame')
+        print(f'{"transport":>10} {"msg/s":>12} {"cpu us/msg":>12}')
+
+        for name, socket_type, options in transports:
+            rate, cpu = asyncio.run(receive(socket_type, options, len(lines)))
+            print(f'{name:>10} {rate:>12,.0f} {cpu:>12.2f}')
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
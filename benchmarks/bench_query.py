@@ -0,0 +1,57 @@
+"""
+Microbenchmark of the helix query builder
+
+Builds user lookup queries of growing size with both the original string concatenation and twitch.query.Query.
+The time per identifier stays flat for Query, showing it scales linearly, while the original grows with the size.
+
+    python benchmarks/bench_query.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from twitch.query import Query  # noqa: E402
+
+
+def concatenated(users):
+    # The per endpoint builder this replaces, kept for comparison
+    params = ''
+
+    if isinstance(users[0], str) and not users[0].isdigit():
+        params += f'?login={users[0]}'
+    elif isinstance(users[0], int) or users[0].isdigit():
+        params += f'?id={users[0]}'
+
+    for u in users:
+        if users.index(u) == 0:
+            continue
+
+        if isinstance(u, str) and not u.isdigit():
+            params += f'&login={u}'
+        elif isinstance(u, int) or u.isdigit():
+            params += f'&id={u}'
+
+    return params
+
+
+def built(users):
+    return str(Query().identifiers(users, 'id', 'login'))
+
+
+def main():
+    print(f'{"ids":>8} {"concatenated us/id":>20} {"query us/id":>14}')
+
+    for size in (100, 1000, 5000, 20000):
+        users = [str(i) if i % 2 else f'user{i}' for i in range(size)]
+        runs = max(1, 20000 // size)
+
+        old = min(timeit.repeat(lambda: concatenated(users), number=runs, repeat=3)) / runs / size * 1e6
+        new = min(timeit.repeat(lambda: built(users), number=runs, repeat=3)) / runs / size * 1e6
+
+        print(f'{size:>8} {old:>20.3f} {new:>14.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 from .client import Twitch
+from .sync import SyncTwitch
 
 # insert version num
 __version__ = ''
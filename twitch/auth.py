@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import time
+
+from .cache import LRUCache
+from .errors import NotAuthorizedException
+
+
+logger = logging.getLogger(__name__)
+
+TOKEN_URL = 'https://id.twitch.tv/oauth2/token'
+
+
+class AppTokenManager:
+    """
+    Defines the lifecycle of a client credentials app token
+    https://dev.twitch.tv/docs/authentication/getting-tokens-oauth#oauth-client-credentials-flow
+
+    The token is refreshed in the background `refresh_margin` seconds before it expires. Concurrent refreshes,
+    e.g. from many requests hitting a 401 at once, are collapsed into a single request to the token endpoint.
+    """
+
+    def __init__(self, http, client_id, client_secret, scopes=None, *, refresh_margin=300, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._http = http
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._scopes = scopes or []
+        self._refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0.0
+        self._headers = {}
+        self._refreshing = None
+        self._refresh_task = None
+
+    def __repr__(self):
+        return f"<AppTokenManager - client_id:{self._client_id} expires_at:{self._expires_at}>"
+
+    @property
+    def token(self):
+        return self._token
+
+    @property
+    def expires_at(self):
+        return self._expires_at
+
+    @property
+    def expired(self):
+        return self._token is None or time.time() >= self._expires_at
+
+    @property
+    def headers(self):
+        return self._headers
+
+    async def get(self):
+        if self.expired:
+            await self.refresh(stale=self._token)
+        return self._token
+
+    async def refresh(self, stale=None):
+        # Someone else already replaced the token the caller saw fail
+        if stale is not None and self._token is not None and self._token != stale:
+            return self._token
+
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = self.loop.create_task(self._refresh())
+
+        return await asyncio.shield(self._refreshing)
+
+    async def _refresh(self):
+        res = await self._http.rrequest('POST', TOKEN_URL, params={
+            'client_id': self._client_id,
+            'client_secret': self._client_secret,
+            'grant_type': 'client_credentials',
+            'scope': ' '.join(self._scopes),
+        })
+
+        if not isinstance(res, dict) or 'access_token' not in res:
+            raise NotAuthorizedException(f'Could not obtain an app token: {res}')
+
+        self._token = res['access_token']
+        self._expires_at = time.time() + res.get('expires_in', 3600)
+        self._headers = {'Authorization': f'Bearer {self._token}'}
+        logger.debug(f'Refreshed app token, expires in {res.get("expires_in")}s')
+
+        self._schedule(res.get('expires_in', 3600))
+        return self._token
+
+    def _schedule(self, expires_in):
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+
+        self._refresh_task = self.loop.create_task(self._refresh_later(max(expires_in - self._refresh_margin, 0)))
+
+    async def _refresh_later(self, delay):
+        await asyncio.sleep(delay)
+
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning(f'Proactive app token refresh failed: {e!r}')
+            self._refresh_task = self.loop.create_task(self._refresh_later(min(60, max(self._expires_at - time.time(), 1))))
+
+    def close(self):
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+
+
+def scope_names(scopes):
+    # Accept both scope strings and the Scope accessors themselves, e.g. Scope.Bits.read
+    return {scope() if callable(scope) else scope for scope in scopes}
+
+
+class UserToken:
+    """
+    Defines an oauth token granted to the client by a user
+    """
+
+    __slots__ = ('_user_id', '_access_token', '_refresh_token', '_scopes', '_expires_at', '_client_id')
+
+    def __init__(self, user_id, access_token, refresh_token=None, scopes=None, expires_at=None, client_id=None):
+        self._user_id = str(user_id)
+        self._client_id = client_id
+        self._access_token = access_token
+        self._refresh_token = refresh_token
+        self._scopes = frozenset(scope_names(scopes or []))
+        self._expires_at = expires_at
+
+    def __repr__(self):
+        return f"<UserToken - user_id:{self._user_id} scopes:{' '.join(sorted(self._scopes))} expires_at:{self._expires_at}>"
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['user_id'], data['access_token'], data.get('refresh_token'), data.get('scopes'), data.get('expires_at'),
+                   data.get('client_id'))
+
+    def to_dict(self):
+        return {
+            'user_id': self._user_id,
+            'access_token': self._access_token,
+            'refresh_token': self._refresh_token,
+            'scopes': sorted(self._scopes),
+            'expires_at': self._expires_at,
+            'client_id': self._client_id,
+        }
+
+    @property
+    def user_id(self):
+        return self._user_id
+
+    @property
+    def client_id(self):
+        return self._client_id
+
+    @property
+    def access_token(self):
+        return self._access_token
+
+    @property
+    def refresh_token(self):
+        return self._refresh_token
+
+    @property
+    def scopes(self):
+        return self._scopes
+
+    @property
+    def expires_at(self):
+        return self._expires_at
+
+    @property
+    def headers(self):
+        return {'Authorization': f'Bearer {self._access_token}'}
+
+    def expires_within(self, seconds):
+        return self._expires_at is not None and time.time() + seconds >= self._expires_at
+
+    def missing_scopes(self, *scopes):
+        return scope_names(scopes) - self._scopes
+
+
+class MemoryTokenBackend:
+    """
+    Defines the default user token backend, keeping every token in process
+
+    Persistent backends implement the same coroutines and store the dicts produced by UserToken.to_dict
+    """
+
+    def __init__(self):
+        self._tokens = {}
+
+    async def load(self, user_id):
+        return self._tokens.get(user_id)
+
+    async def save(self, data):
+        self._tokens[data['user_id']] = data
+
+    async def delete(self, user_id):
+        self._tokens.pop(user_id, None)
+
+    async def user_ids(self):
+        return list(self._tokens)
+
+
+class UserTokenStore:
+    """
+    Defines the store of user tokens the client acts with on behalf of many users
+
+    Recently used tokens are kept in a bounded LRU in front of a pluggable backend. Tokens are refreshed
+    `refresh_margin` seconds before expiry, at most `max_concurrency` at a time, with the credential they were
+    issued to, and scopes are checked locally before a request is sent.
+    """
+
+    def __init__(self, http, *, backend=None, maxsize=1000, refresh_margin=300, max_concurrency=10, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._http = http
+        self._backend = backend or MemoryTokenBackend()
+        self._tokens = LRUCache(maxsize)
+        self._refresh_margin = refresh_margin
+        self._concurrency = asyncio.Semaphore(max_concurrency)
+        self._refreshing = {}
+
+    def __repr__(self):
+        return f"<UserTokenStore - cached:{len(self._tokens)} refreshing:{len(self._refreshing)}>"
+
+    @property
+    def backend(self):
+        return self._backend
+
+    async def put(self, token):
+        self._tokens.set(token.user_id, token)
+        await self._backend.save(token.to_dict())
+        return token
+
+    async def remove(self, user_id):
+        self._tokens.pop(str(user_id))
+        await self._backend.delete(str(user_id))
+
+    async def get(self, user_id):
+        user_id = str(user_id)
+        token = self._tokens.get(user_id)
+
+        if token is None:
+            data = await self._backend.load(user_id)
+            if data is None:
+                return None
+
+            token = UserToken.from_dict(data)
+            self._tokens.set(user_id, token)
+
+        if token.expires_within(self._refresh_margin) and token.refresh_token:
+            token = await self.refresh(user_id)
+
+        return token
+
+    async def require(self, user_id, *scopes):
+        token = await self.get(user_id)
+
+        if token is None:
+            raise NotAuthorizedException(f'No token is stored for user {user_id}')
+
+        missing = token.missing_scopes(*scopes)
+        if missing:
+            raise NotAuthorizedException(f'Token for user {user_id} is missing scopes: {" ".join(sorted(missing))}')
+
+        return token
+
+    async def refresh(self, user_id, stale=None):
+        user_id = str(user_id)
+
+        current = self._tokens.peek(user_id)
+        if stale is not None and current is not None and current.access_token != stale:
+            return current
+
+        task = self._refreshing.get(user_id)
+        if task is None:
+            task = self._refreshing[user_id] = self.loop.create_task(self._refresh(user_id))
+            task.add_done_callback(lambda _: self._refreshing.pop(user_id, None))
+
+        return await asyncio.shield(task)
+
+    async def _refresh(self, user_id):
+        token = self._tokens.peek(user_id)
+        if token is None:
+            data = await self._backend.load(user_id)
+            token = UserToken.from_dict(data) if data else None
+
+        credential = self._http.credentials.get(token.client_id) if token else None
+        if token is None or not token.refresh_token or credential is None or not credential.client_secret:
+            raise NotAuthorizedException(f'Token for user {user_id} cannot be refreshed')
+
+        async with self._concurrency:
+            res = await self._http.rrequest('POST', TOKEN_URL, params={
+                'client_id': credential.client_id,
+                'client_secret': credential.client_secret,
+                'grant_type': 'refresh_token',
+                'refresh_token': token.refresh_token,
+            })
+
+        if not isinstance(res, dict) or 'access_token' not in res:
+            raise NotAuthorizedException(f'Could not refresh token for user {user_id}: {res}')
+
+        expires_in = res.get('expires_in')
+        return await self.put(UserToken(user_id, res['access_token'], res.get('refresh_token', token.refresh_token),
+                                        res.get('scope', token.scopes),
+                                        time.time() + expires_in if expires_in else None, token.client_id))
+
+    async def refresh_expiring(self, within=None):
+        # Refresh every stored token expiring soon, concurrently but bounded by the store's concurrency limit
+        within = self._refresh_margin if within is None else within
+        expiring = []
+
+        for user_id in await self._backend.user_ids():
+            token = self._tokens.peek(user_id)
+            if token is None:
+                data = await self._backend.load(user_id)
+                token = UserToken.from_dict(data) if data else None
+
+            if token is not None and token.refresh_token and token.expires_within(within):
+                expiring.append(user_id)
+
+        results = await asyncio.gather(*(self.refresh(user_id) for user_id in expiring), return_exceptions=True)
+
+        for user_id, result in zip(expiring, results):
+            if isinstance(result, Exception):
+                logger.warning(f'Failed to refresh token for user {user_id}: {result!r}')
+
+        return [result for result in results if isinstance(result, UserToken)]
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchLoader:
+    """
+    Defines a loader that coalesces single key lookups into batched requests
+
+    Keys requested within the same event loop tick, or within `window` seconds of the first one, are sent as
+    one request of up to `max_batch` keys. Callers asking for the same key share a single result.
+    A batch is sent with the most urgent priority any of its callers asked for. Keys are compared after `normalize`,
+    e.g. to match names case insensitively, but sent as the first caller spelled them.
+    """
+
+    def __init__(self, fetch, match, *, normalize=None, max_batch=100, window=0, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._fetch = fetch
+        self._match = match
+        self._normalize = normalize or (lambda key: key)
+        self._max_batch = max_batch
+        self._window = window
+        self._pending = {}
+        self._priority = None
+        self._handle = None
+
+    def __repr__(self):
+        return f"<BatchLoader - pending:{len(self._pending)} max_batch:{self._max_batch} window:{self._window}>"
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    async def load(self, key, priority=None):
+        if priority is not None and (self._priority is None or priority < self._priority):
+            self._priority = priority
+
+        normalized = self._normalize(key)
+        pending = self._pending.get(normalized)
+
+        if pending is not None:
+            future = pending[1]
+        else:
+            future = self.loop.create_future()
+            self._pending[normalized] = (key, future)
+
+            if len(self._pending) >= self._max_batch:
+                self._dispatch()
+            elif self._handle is None:
+                if self._window:
+                    self._handle = self.loop.call_later(self._window, self._dispatch)
+                else:
+                    self._handle = self.loop.call_soon(self._dispatch)
+
+        # Shield so a cancelled caller does not cancel the result for everyone sharing the key
+        return await asyncio.shield(future)
+
+    def _dispatch(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        batch, self._pending = self._pending, {}
+        priority, self._priority = self._priority, None
+
+        if batch:
+            self.loop.create_task(self._run(batch, priority))
+
+    async def _run(self, batch, priority):
+        try:
+            items = await self._fetch([key for key, _ in batch.values()], priority)
+        except Exception as e:
+            for _, future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        found = {}
+        for item in items:
+            for key in self._match(item):
+                found[key] = item
+
+        for normalized, (_, future) in batch.items():
+            if not future.done():
+                future.set_result(found.get(normalized))
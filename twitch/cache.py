@@ -0,0 +1,283 @@
+import asyncio
+import collections
+import json
+import logging
+import sqlite3
+import time
+
+from .sqlite import SQLiteDatabase
+
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Defines a size bounded least recently used cache with time based expiry
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, *, on_evict=None):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._on_evict = on_evict
+        self._data = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return f"<LRUCache - size:{len(self._data)} maxsize:{self._maxsize} ttl:{self._ttl}>"
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and not self._expired(entry)
+
+    @property
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _expired(self, entry):
+        return entry[0] is not None and entry[0] <= time.monotonic()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return default
+
+        if self._expired(entry):
+            self.misses += 1
+            self.pop(key)
+            return default
+
+        self.hits += 1
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def peek(self, key, default=None):
+        entry = self._data.get(key)
+
+        if entry is None or self._expired(entry):
+            return default
+
+        return entry[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self._ttl
+
+        self._data[key] = (time.monotonic() + ttl if ttl is not None else None, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self._maxsize:
+            old_key, (_, old_value) = self._data.popitem(last=False)
+            self.evictions += 1
+
+            if self._on_evict:
+                self._on_evict(old_key, old_value)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+
+        if entry is None:
+            return default
+
+        if self._on_evict:
+            self._on_evict(key, entry[1])
+
+        return entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+
+class EntityCache:
+    """
+    Defines the in process identity map of users, games and streams
+
+    Users are indexed by both id and lowercase login, games by id and lowercase name and streams by their broadcaster's id
+    and lowercase login. A cached lookup returns the same object until it expires or is evicted, fresh data for a cached
+    entity is copied onto that object.
+    """
+
+    def __init__(self, *, maxsize=10000, user_ttl=3600, game_ttl=86400, stream_ttl=60, backend=None):
+        self.backend = backend
+        self._ttls = {'user': user_ttl, 'game': game_ttl, 'stream': stream_ttl}
+        self.users = LRUCache(maxsize, user_ttl,
+                              on_evict=lambda key, user: self._drop_alias(self._user_aliases, user.username.lower(), key))
+        self.games = LRUCache(maxsize, game_ttl,
+                              on_evict=lambda key, game: self._drop_alias(self._game_aliases, game.name.lower(), key))
+        self.streams = LRUCache(maxsize, stream_ttl,
+                                on_evict=lambda key, stream: self._drop_alias(self._stream_aliases, stream.login, key))
+        self._user_aliases = {}
+        self._game_aliases = {}
+        self._stream_aliases = {}
+
+    def __repr__(self):
+        return f"<EntityCache - users:{len(self.users)} games:{len(self.games)} streams:{len(self.streams)}>"
+
+    @property
+    def stats(self):
+        return {
+            'users': self.users.stats,
+            'games': self.games.stats,
+            'streams': self.streams.stats,
+        }
+
+    def ttl(self, kind):
+        return self._ttls[kind]
+
+    @staticmethod
+    def _drop_alias(aliases, alias, key):
+        if aliases.get(alias) == key:
+            del aliases[alias]
+
+    @staticmethod
+    def _refresh(cached, fresh):
+        # Keep handing out the cached object so every lookup shares one identity, but with the data just fetched
+        if cached is None or type(cached) is not type(fresh):
+            return fresh
+
+        for slot in type(fresh).__slots__:
+            setattr(cached, slot, getattr(fresh, slot))
+        return cached
+
+    def get_user(self, key):
+        return self.users.get(self._user_aliases.get(key, key))
+
+    def put_user(self, user):
+        cached = self.users.peek(user.id)
+        if cached is not None:
+            self._drop_alias(self._user_aliases, cached.username.lower(), cached.id)
+
+        user = self._refresh(cached, user)
+        self.users.set(user.id, user)
+        self._user_aliases[user.username.lower()] = user.id
+        return user
+
+    def get_game(self, key):
+        return self.games.get(self._game_aliases.get(key.lower(), key))
+
+    def put_game(self, game):
+        cached = self.games.peek(game.id)
+        if cached is not None:
+            self._drop_alias(self._game_aliases, cached.name.lower(), cached.id)
+
+        game = self._refresh(cached, game)
+        self.games.set(game.id, game)
+        self._game_aliases[game.name.lower()] = game.id
+        return game
+
+    def get_stream(self, key):
+        return self.streams.get(self._stream_aliases.get(key, key))
+
+    def put_stream(self, stream):
+        cached = self.streams.peek(stream.broadcaster.id)
+        if cached is not None:
+            self._drop_alias(self._stream_aliases, cached.login, cached.broadcaster.id)
+
+        # A new stream of the same broadcaster is a different object altogether
+        if cached is not None and cached.id == stream.id:
+            stream = self._refresh(cached, stream)
+
+        self.streams.set(stream.broadcaster.id, stream)
+        self._stream_aliases[stream.login] = stream.broadcaster.id
+        return stream
+
+    def clear(self):
+        self.users.clear()
+        self.games.clear()
+        self.streams.clear()
+        self._user_aliases.clear()
+        self._game_aliases.clear()
+        self._stream_aliases.clear()
+
+
+class SQLiteCacheBackend:
+    """
+    Defines a persistent sqlite store of raw entity payloads
+
+    Payloads are stored under every key they can be looked up by along with their expiry time, so a freshly started
+    process can answer lookups without going to the network. Expired rows are removed by a background compaction task.
+    """
+
+    def __init__(self, path, *, compact_interval=600, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._path = path
+        self._compact_interval = compact_interval
+        self._compact_task = None
+        self._sqlite = SQLiteDatabase(path, 'CREATE TABLE IF NOT EXISTS entities ('
+                                            'kind TEXT NOT NULL, key TEXT NOT NULL, data TEXT NOT NULL, '
+                                            'expires_at REAL NOT NULL, PRIMARY KEY (kind, key))', loop=self.loop)
+        self._db = self._sqlite.connection
+
+    def __repr__(self):
+        return f"<SQLiteCacheBackend - path:{self._path}>"
+
+    async def _run(self, func, *args):
+        if self._compact_task is None and self._compact_interval:
+            self._compact_task = self.loop.create_task(self._compact_loop())
+
+        return await self._sqlite.run(func, *args)
+
+    def _get_many(self, kind, keys):
+        now = time.time()
+        ret = {}
+
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self._db.execute(f'SELECT key, data FROM entities WHERE kind = ? AND expires_at > ? '
+                                    f'AND key IN ({", ".join("?" * len(chunk))})', (kind, now, *chunk))
+            for key, data in rows:
+                ret[key] = json.loads(data)
+
+        return ret
+
+    def _put_many(self, kind, items, ttl):
+        expires_at = time.time() + ttl
+        rows = []
+
+        for keys, data in items:
+            payload = json.dumps(data)
+            rows.extend((kind, str(key), payload, expires_at) for key in keys)
+
+        self._db.executemany('INSERT OR REPLACE INTO entities (kind, key, data, expires_at) VALUES (?, ?, ?, ?)', rows)
+        self._db.commit()
+
+    def _compact(self):
+        removed = self._db.execute('DELETE FROM entities WHERE expires_at <= ?', (time.time(),)).rowcount
+        self._db.commit()
+        return removed
+
+    async def get_many(self, kind, keys):
+        return await self._run(self._get_many, kind, [str(key) for key in keys])
+
+    async def put_many(self, kind, items, ttl):
+        await self._run(self._put_many, kind, list(items), ttl)
+
+    async def compact(self):
+        return await self._run(self._compact)
+
+    async def _compact_loop(self):
+        while True:
+            await asyncio.sleep(self._compact_interval)
+
+            try:
+                removed = await self._sqlite.run(self._compact)
+                logger.debug(f'Compacted {removed} expired entries from {self._path}')
+            except sqlite3.Error as e:
+                logger.warning(f'Failed to compact cache {self._path}: {e}')
+
+    def close(self):
+        if self._compact_task and not self._compact_task.done():
+            self._compact_task.cancel()
+
+        self._sqlite.close()
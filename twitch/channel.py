@@ -4,19 +4,24 @@ class TwitchChannel:
     The Base Twitch Channel Object
     """
 
-    async def send(self, message):
-        pass
+    def _chat(self):
+        return self._client.chat
 
 
 class WhisperChannel(TwitchChannel):
     """
     The channel used to directly message a user
     """
-    pass
+
+    async def send(self, message, *, sender):
+        # Whispers go through helix on behalf of the sender, their token needs the user:manage:whispers scope
+        return await self._client.send_whisper(sender, self, message)
 
 
 class ChatChannel(TwitchChannel):
     """
     The channel used to message in a twitch channel chat
     """
-    pass
+
+    async def send(self, message, *, key=None):
+        return await self._chat().send(self.login, message, key=key)
@@ -0,0 +1,825 @@
+import asyncio
+import collections
+import itertools
+import logging
+import random
+
+from datetime import datetime
+
+from .errors import InvalidOperationException, NotAuthorizedException
+from .events import EventDispatcher
+from .genericutils import chunks
+from .irc import WebSocketChatSocket
+from .ircparser import parse
+from .ratelimit import WindowLimiter
+from .retry import RetryPolicy
+from .sendqueue import ChatLimits, SendQueue
+from .transport import Transport
+
+
+logger = logging.getLogger(__name__)
+
+
+def channel_name(channel):
+    return str(channel).lstrip('#').lower()
+
+
+def parse_badges(raw):
+    if not raw:
+        return {}
+    return dict(badge.partition('/')[::2] for badge in raw.split(','))
+
+
+def _single_line(content):
+    # A line break would end the PRIVMSG and send the rest as a command of its own
+    return ' '.join(str(content).splitlines())
+
+
+class ChatEvent:
+    """
+    Defines the base of every chat event, a thin view over the message it was parsed from
+
+    Fields are read from the message when accessed, so events nobody looks at cost nothing beyond parsing the line.
+    """
+
+    __slots__ = ('_message', '_connection')
+
+    def __init__(self, message, connection=None):
+        self._message = message
+        self._connection = connection
+
+    def __repr__(self):
+        return f"<{type(self).__name__} - channel:{self.channel}>"
+
+    @property
+    def message(self):
+        return self._message
+
+    @property
+    def connection(self):
+        return self._connection
+
+    @property
+    def tags(self):
+        return self._message.tags
+
+    @property
+    def channel(self):
+        return self._message.channel
+
+    @property
+    def room_id(self):
+        return self._message.tags.get('room-id')
+
+    @property
+    def sent_at(self):
+        ts = self._message.tags.get('tmi-sent-ts')
+        return datetime.utcfromtimestamp(int(ts) / 1000) if ts else None
+
+
+class ChatMessage(ChatEvent):
+    """
+    Defines a message sent to a channel's chat
+    https://dev.twitch.tv/docs/irc/tags#privmsg-twitch-tags
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"<ChatMessage - channel:{self.channel} author:{self.author} content:{self.content!r}>"
+
+    def __str__(self):
+        return self.content
+
+    @property
+    def id(self):
+        return self._message.tags.get('id')
+
+    @property
+    def author(self):
+        return self._message.nick
+
+    @property
+    def display_name(self):
+        return self._message.tags.get('display-name') or self._message.nick
+
+    @property
+    def user_id(self):
+        return self._message.tags.get('user-id')
+
+    @property
+    def is_action(self):
+        return self._message.trailing.startswith('\x01ACTION ')
+
+    @property
+    def content(self):
+        content = self._message.trailing
+        return content[8:].rstrip('\x01') if content.startswith('\x01ACTION ') else content
+
+    @property
+    def badges(self):
+        return parse_badges(self._message.tags.get('badges'))
+
+    @property
+    def is_mod(self):
+        return self._message.tags.get('mod') == '1' or 'broadcaster' in self.badges
+
+    @property
+    def is_subscriber(self):
+        return self._message.tags.get('subscriber') == '1'
+
+    @property
+    def bits(self):
+        return int(self._message.tags.get('bits') or 0)
+
+    @property
+    def emotes(self):
+        return self._message.tags.get('emotes') or None
+
+    @property
+    def reply_to(self):
+        return self._message.tags.get('reply-parent-msg-id')
+
+
+class UserNotice(ChatEvent):
+    """
+    Defines a notice about a user's action, e.g. a subscription, a raid or a gifted subscription
+    https://dev.twitch.tv/docs/irc/tags#usernotice-twitch-tags
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"<UserNotice - channel:{self.channel} type:{self.type} login:{self.login}>"
+
+    @property
+    def id(self):
+        return self._message.tags.get('id')
+
+    @property
+    def type(self):
+        return self._message.tags.get('msg-id')
+
+    @property
+    def login(self):
+        return self._message.tags.get('login')
+
+    @property
+    def user_id(self):
+        return self._message.tags.get('user-id')
+
+    @property
+    def system_message(self):
+        return self._message.tags.get('system-msg')
+
+    @property
+    def content(self):
+        # The message the user attached, if any
+        return self._message.params[1] if len(self._message.params) > 1 else None
+
+    @property
+    def params(self):
+        return {key[len('msg-param-'):]: value for key, value in self._message.tags.items() if key.startswith('msg-param-')}
+
+
+class ClearChat(ChatEvent):
+    """
+    Defines the removal of every message of a channel or of a single user, i.e. a ban or a timeout
+    https://dev.twitch.tv/docs/irc/tags#clearchat-twitch-tags
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"<ClearChat - channel:{self.channel} target:{self.target} duration:{self.duration}>"
+
+    @property
+    def target(self):
+        # None when the whole chat was cleared
+        return self._message.params[1] if len(self._message.params) > 1 else None
+
+    @property
+    def target_user_id(self):
+        return self._message.tags.get('target-user-id')
+
+    @property
+    def duration(self):
+        # None for permanent bans
+        duration = self._message.tags.get('ban-duration')
+        return int(duration) if duration else None
+
+    @property
+    def is_ban(self):
+        return self.target is not None and self.duration is None
+
+
+class ClearMessage(ChatEvent):
+    """
+    Defines the removal of a single message
+    https://dev.twitch.tv/docs/irc/tags#clearmsg-twitch-tags
+    """
+
+    __slots__ = ()
+
+    @property
+    def login(self):
+        return self._message.tags.get('login')
+
+    @property
+    def target_message_id(self):
+        return self._message.tags.get('target-msg-id')
+
+    @property
+    def content(self):
+        return self._message.trailing
+
+
+class RoomState(ChatEvent):
+    """
+    Defines the chat settings of a channel
+
+    Sent in full when joining and with only the changed settings afterwards, settings that were not sent are None
+    https://dev.twitch.tv/docs/irc/tags#roomstate-twitch-tags
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"<RoomState - channel:{self.channel} slow:{self.slow} followers_only:{self.followers_only}>"
+
+    def _setting(self, key):
+        value = self._message.tags.get(key)
+        return int(value) if value not in (None, '') else None
+
+    @property
+    def emote_only(self):
+        value = self._setting('emote-only')
+        return None if value is None else bool(value)
+
+    @property
+    def followers_only(self):
+        # Minutes a user must have followed for, -1 when disabled
+        return self._setting('followers-only')
+
+    @property
+    def r9k(self):
+        value = self._setting('r9k')
+        return None if value is None else bool(value)
+
+    @property
+    def slow(self):
+        # Seconds between two messages of a user, 0 when disabled
+        return self._setting('slow')
+
+    @property
+    def subs_only(self):
+        value = self._setting('subs-only')
+        return None if value is None else bool(value)
+
+
+class UserState(ChatEvent):
+    """
+    Defines the state of the connected user in a channel, or globally for GLOBALUSERSTATE
+    https://dev.twitch.tv/docs/irc/tags#userstate-twitch-tags
+    """
+
+    __slots__ = ()
+
+    @property
+    def display_name(self):
+        return self._message.tags.get('display-name')
+
+    @property
+    def badges(self):
+        return parse_badges(self._message.tags.get('badges'))
+
+    @property
+    def is_mod(self):
+        return self._message.tags.get('mod') == '1' or 'broadcaster' in self.badges
+
+
+class Notice(ChatEvent):
+    """
+    Defines a notice from the server, e.g. the result of a command
+    https://dev.twitch.tv/docs/irc/msg-id
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"<Notice - channel:{self.channel} type:{self.type}>"
+
+    @property
+    def type(self):
+        return self._message.tags.get('msg-id')
+
+    @property
+    def content(self):
+        return self._message.trailing
+
+
+class Whisper(ChatEvent):
+    """
+    Defines a private message sent to the connected user
+    """
+
+    __slots__ = ()
+
+    @property
+    def author(self):
+        return self._message.nick
+
+    @property
+    def user_id(self):
+        return self._message.tags.get('user-id')
+
+    @property
+    def content(self):
+        return self._message.trailing
+
+
+class Membership(ChatEvent):
+    """
+    Defines a user joining or leaving a channel, only sent with the membership capability
+    """
+
+    __slots__ = ()
+
+    @property
+    def user(self):
+        return self._message.nick
+
+
+EVENTS = {
+    'PRIVMSG': ('message', ChatMessage),
+    'USERNOTICE': ('usernotice', UserNotice),
+    'CLEARCHAT': ('clearchat', ClearChat),
+    'CLEARMSG': ('clearmsg', ClearMessage),
+    'ROOMSTATE': ('roomstate', RoomState),
+    'USERSTATE': ('userstate', UserState),
+    'GLOBALUSERSTATE': ('globaluserstate', UserState),
+    'NOTICE': ('notice', Notice),
+    'WHISPER': ('whisper', Whisper),
+    'JOIN': ('join', Membership),
+    'PART': ('part', Membership),
+}
+
+
+class ChatConnection:
+    """
+    Defines a single connection to twitch chat and the channels joined on it
+
+    The connection answers the server's PINGs and sends its own when the socket has been idle for `ping_interval`
+    seconds, measuring the round trip as `latency`. When the socket closes, a PONG is missing or the server asks for
+    it, the connection is reopened with a jittered exponential backoff and every channel is joined again, paced by
+    `join_limiter`. After `max_failures` attempts in a row that never got ready the client is told the connection died.
+
+    Messages go through the connection's `outbox`, which paces them by the account's `limits`.
+    """
+
+    def __init__(self, chat, socket_factory, *, nick, token=None, capabilities=(), ping_interval=60, ping_timeout=10,
+                 retry=None, join_limiter=None, max_failures=3, limits=None, max_queue=100, max_age=30, name=None,
+                 loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.name = name
+        self._chat = chat
+        self._socket_factory = socket_factory
+        self._socket = None
+        self._nick = nick
+        self._token = token
+        self._capabilities = capabilities
+        self._ping_interval = ping_interval
+        self._ping_timeout = ping_timeout
+        self._retry = retry or RetryPolicy(backoff_base=1, backoff_cap=120)
+        self._join_limiter = join_limiter
+        self._max_failures = max_failures
+        self._joining = None
+        self.outbox = SendQueue(self, limits or ChatLimits(loop=self.loop), max_size=max_queue, max_age=max_age,
+                                loop=self.loop)
+        self._channels = set()
+        self._ready = asyncio.Event()
+        self._task = None
+        self.error = None
+        self._closing = False
+        self._ping_sent_at = None
+        self.latency = None
+        self.messages = 0
+        self.reconnects = 0
+        self.last_message_at = None
+
+    def __repr__(self):
+        return f"<ChatConnection - name:{self.name} channels:{len(self._channels)} ready:{self.ready}>"
+
+    @property
+    def channels(self):
+        return set(self._channels)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    @property
+    def stats(self):
+        return {
+            'name': self.name,
+            'channels': len(self._channels),
+            'ready': self.ready,
+            'latency': self.latency,
+            'messages': self.messages,
+            'reconnects': self.reconnects,
+            'queued': self.outbox.depth,
+            'sent': self.outbox.sent,
+            'dropped': self.outbox.dropped,
+            'idle': self.loop.time() - self.last_message_at if self.last_message_at is not None else None,
+        }
+
+    def start(self):
+        if not self.running:
+            self._closing = False
+            self.error = None
+            self._task = self.loop.create_task(self._run())
+            self.outbox.start()
+        return self
+
+    async def wait_ready(self, timeout=None):
+        # Raises why the connection gave up, e.g. a refused login, rather than waiting for it for good
+        ready = self.loop.create_task(self._ready.wait())
+        waiters = {ready, self._task} if self._task is not None else {ready}
+
+        try:
+            done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            ready.cancel()
+
+        if not done:
+            raise asyncio.TimeoutError()
+        elif not self.ready:
+            raise self.error or ConnectionError(f'Chat connection {self.name} was closed')
+
+    async def _run(self):
+        attempt = 0
+        failures = 0
+
+        while not self._closing:
+            was_ready = False
+
+            try:
+                await self._session()
+            except asyncio.CancelledError:
+                raise
+            except NotAuthorizedException as e:
+                logger.error(f'Chat connection {self.name} was refused: {e}')
+                self.error = e
+                self._closing = True
+            except Exception as e:
+                logger.warning(f'Chat connection {self.name} failed: {e!r}')
+            finally:
+                was_ready = self.ready
+                self._ready.clear()
+                if self._joining is not None and not self._joining.done():
+                    self._joining.cancel()
+                if self._socket is not None:
+                    await self._socket.close()
+                if was_ready:
+                    self._chat.dispatch('disconnect', self)
+
+            if was_ready:
+                attempt = failures = 0
+            else:
+                failures += 1
+
+            if self._closing:
+                break
+            elif self._max_failures and failures >= self._max_failures and self._chat._connection_failed(self):
+                # The client moved our channels to healthy connections
+                self._closing = True
+                break
+
+            delay = self._retry.backoff(attempt)
+            attempt += 1
+            self.reconnects += 1
+            logger.debug(f'Reconnecting chat connection {self.name} in {delay:.2f}s')
+            await asyncio.sleep(delay)
+
+    async def _session(self):
+        self._socket = self._socket_factory()
+        await self._socket.open()
+
+        login = [f'CAP REQ :{" ".join(self._capabilities)}'] if self._capabilities else []
+        if self._token:
+            login.append(f'PASS {self._token if self._token.startswith("oauth:") else "oauth:" + self._token}')
+        login.append(f'NICK {self._nick}')
+        await self._socket.send(login)
+
+        self._ping_sent_at = None
+        timeout = self._ping_interval
+
+        while True:
+            try:
+                lines = await self._socket.receive(timeout=timeout)
+            except asyncio.TimeoutError:
+                if self._ping_sent_at is not None:
+                    raise ConnectionError(f'No PONG within {self._ping_timeout}s')
+
+                self._ping_sent_at = self.loop.time()
+                await self._socket.send(['PING :tmi.twitch.tv'])
+                timeout = self._ping_timeout
+                continue
+
+            if lines is None:
+                return
+
+            # Any traffic shows the connection is alive
+            timeout = self._ping_interval
+            self.last_message_at = self.loop.time()
+
+            for line in lines:
+                if line and await self._process(parse(line)) is False:
+                    return
+
+    async def _process(self, message):
+        # Returns False when the connection should be reopened
+        command = message.command
+
+        if command == 'PING':
+            await self._socket.send([f'PONG :{message.trailing}'])
+        elif command == 'PONG':
+            if self._ping_sent_at is not None:
+                self.latency = self.loop.time() - self._ping_sent_at
+                self._ping_sent_at = None
+        elif command == '001':
+            self._ready.set()
+            # Joins are paced, keep reading meanwhile so PINGs are still answered
+            self._joining = self.loop.create_task(self._join(self._channels))
+            self.outbox.wake()
+            self._chat.dispatch('connect', self)
+        elif command == 'RECONNECT':
+            logger.debug(f'Server asked chat connection {self.name} to reconnect')
+            return False
+        elif command == 'NOTICE' and message.channel is None and 'authentication failed' in message.trailing.lower():
+            raise NotAuthorizedException(message.trailing)
+        else:
+            if command == 'ROOMSTATE' or command == 'USERSTATE':
+                self.outbox.observe(message)
+
+            self.messages += 1
+            self._chat._receive(message, self)
+
+    async def send(self, *lines):
+        await self.wait_ready()
+        await self._socket.send(lines)
+
+    async def _join(self, channels):
+        # Several channels fit on one JOIN line, each of them counts against the join limit
+        size = min(20, self._join_limiter.limit) if self._join_limiter is not None else 20
+        for chunk in chunks(sorted(channels), size):
+            if self._join_limiter is not None:
+                await self._join_limiter.acquire(len(chunk))
+
+            # Channels parted while waiting for the limiter are skipped
+            chunk = [channel for channel in chunk if channel in self._channels]
+            if chunk and self.ready:
+                await self._socket.send([f'JOIN {",".join("#" + channel for channel in chunk)}'])
+
+    async def join(self, *channels):
+        channels = {channel_name(channel) for channel in channels} - self._channels
+        self._channels.update(channels)
+
+        if self.ready and channels:
+            await self._join(channels)
+
+    async def part(self, *channels):
+        channels = {channel_name(channel) for channel in channels} & self._channels
+        self._channels.difference_update(channels)
+
+        if self.ready and channels:
+            for chunk in chunks(sorted(channels), 20):
+                await self._socket.send([f'PART {",".join("#" + channel for channel in chunk)}'])
+
+    async def close(self):
+        self._closing = True
+        self.outbox.close()
+
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+        if self._socket is not None:
+            await self._socket.close()
+
+
+class ChatClient(EventDispatcher):
+    """
+    Defines a twitch chat client dispatching typed chat events to registered coroutine handlers
+    https://dev.twitch.tv/docs/irc
+
+    Messages are dispatched as on_message, on_usernotice, on_clearchat, on_clearmsg, on_roomstate, on_userstate,
+    on_globaluserstate, on_notice, on_whisper, on_join and on_part events, every parsed line as on_raw. Events without
+    a handler are never built. Connecting without a token logs in anonymously, which can read but not send.
+
+    Channels are spread over as many connections as needed to keep at most `max_channels` on each. Joins on every
+    connection share one limit of `join_limit` channels per `join_period` seconds. When a connection keeps failing
+    while others are healthy its channels are moved to the other connections.
+
+    Sent messages are queued on the connection of their channel and paced to the account's limits, see SendQueue. Up to
+    `max_queue` messages wait on each connection for at most `max_age` seconds.
+
+    Connections go over twitch's WebSocket endpoint unless `socket_type` is TCPChatSocket, which skips the WebSocket
+    framing. Set `socket_options` to pass e.g. a host, port or ssl context to the socket.
+    """
+
+    CAPABILITIES = ('twitch.tv/tags', 'twitch.tv/commands')
+
+    def __init__(self, nick=None, token=None, *, transport=None, capabilities=CAPABILITIES, ping_interval=60,
+                 ping_timeout=10, retry=None, max_channels=100, join_limit=20, join_period=10, message_limit=20,
+                 mod_message_limit=100, max_queue=100, max_age=30, socket_type=WebSocketChatSocket, socket_options=None,
+                 loop=None):
+        super().__init__(loop=loop)
+        self._nick = (nick or f'justinfan{random.randint(1000, 99999)}').lower()
+        self._token = token
+        self._capabilities = capabilities
+        self._ping_interval = ping_interval
+        self._ping_timeout = ping_timeout
+        self._retry = retry
+        self._max_channels = max_channels
+        self._owns_transport = transport is None
+        self.transport = transport or Transport(loop=self.loop)
+        self.join_limiter = WindowLimiter(join_limit, join_period, loop=self.loop)
+        self.limits = ChatLimits(message_limit=message_limit, mod_message_limit=mod_message_limit, loop=self.loop)
+        self._max_queue = max_queue
+        self._max_age = max_age
+        self._socket_type = socket_type
+        self._socket_options = socket_options or {}
+        self.connections = []
+        self._shards = {}
+        self._counter = itertools.count()
+        self._started = False
+
+    def __repr__(self):
+        return f"<ChatClient - nick:{self._nick} channels:{len(self._shards)} connections:{len(self.connections)}>"
+
+    @property
+    def nick(self):
+        return self._nick
+
+    @property
+    def channels(self):
+        return set(self._shards)
+
+    @property
+    def connection(self):
+        # The connection used for traffic not tied to a joined channel
+        if not self.connections:
+            self._add_connection()
+        return self.connections[0]
+
+    @property
+    def latency(self):
+        latencies = [connection.latency for connection in self.connections if connection.latency is not None]
+        return sum(latencies) / len(latencies) if latencies else None
+
+    @property
+    def anonymous(self):
+        return self._token is None
+
+    @property
+    def queued(self):
+        return sum(connection.outbox.depth for connection in self.connections)
+
+    @property
+    def stats(self):
+        return [connection.stats for connection in self.connections]
+
+    def _socket(self):
+        return self._socket_type(self.transport, **self._socket_options)
+
+    def _add_connection(self):
+        connection = ChatConnection(self, self._socket, nick=self._nick, token=self._token,
+                                    capabilities=self._capabilities, ping_interval=self._ping_interval,
+                                    ping_timeout=self._ping_timeout, retry=self._retry, join_limiter=self.join_limiter,
+                                    limits=self.limits, max_queue=self._max_queue, max_age=self._max_age,
+                                    name=str(next(self._counter)), loop=self.loop)
+        self.connections.append(connection)
+
+        if self._started:
+            connection.start()
+        return connection
+
+    def _shard_for(self, pending):
+        # Fill the least loaded connection with room left, open another one once all are full
+        load = {connection: len(connection.channels) + pending[connection] for connection in self.connections}
+        candidates = [connection for connection in self.connections if load[connection] < self._max_channels]
+
+        if not candidates:
+            return self._add_connection()
+        return min(candidates, key=lambda connection: (not connection.ready, load[connection]))
+
+    def _connection_failed(self, connection):
+        # Only give up on a connection while others work, otherwise the network itself is the likely culprit
+        if not any(other.ready for other in self.connections if other is not connection):
+            return False
+
+        logger.warning(f'Chat connection {connection.name} keeps failing, moving its {len(connection.channels)} channels')
+        self.connections.remove(connection)
+        channels = connection.channels
+
+        for channel in channels:
+            self._shards.pop(channel, None)
+
+        self.loop.create_task(self._move(channels, connection.outbox.drain()))
+        self.dispatch('connection_lost', connection)
+        return True
+
+    async def _move(self, channels, items):
+        await self.join(*channels)
+
+        for item in items:
+            self._outbox(item.target).requeue([item])
+
+    def _outbox(self, channel):
+        return (self._shards.get(channel) or self.connection).outbox
+
+    def _receive(self, message, connection):
+        if self.has_listeners('raw'):
+            self.dispatch('raw', message)
+
+        event = EVENTS.get(message.command)
+        if event is not None and self.has_listeners(event[0]):
+            self.dispatch(event[0], event[1](message, connection))
+
+    def start(self):
+        self._started = True
+
+        if not self.connections:
+            self._add_connection()
+
+        for connection in self.connections:
+            connection.start()
+        return self
+
+    async def connect(self, timeout=None):
+        self.start()
+        await self.connection.wait_ready(timeout)
+        return self
+
+    async def join(self, *channels):
+        joins = {}
+        pending = collections.Counter()
+
+        for channel in sorted({channel_name(channel) for channel in channels}):
+            if channel not in self._shards:
+                connection = self._shards[channel] = self._shard_for(pending)
+                pending[connection] += 1
+                joins.setdefault(connection, []).append(channel)
+
+        await asyncio.gather(*(connection.join(*names) for connection, names in joins.items()))
+
+    async def part(self, *channels):
+        parts = {}
+
+        for channel in {channel_name(channel) for channel in channels}:
+            connection = self._shards.pop(channel, None)
+            if connection is not None:
+                parts.setdefault(connection, []).append(channel)
+
+        for connection, names in parts.items():
+            await connection.part(*names)
+
+    async def send(self, channel, content, *, key=None):
+        """
+        Queues a message to a channel, returns True once it was sent or False when it was dropped
+
+        A message with a `key` replaces the unsent message to the channel with the same key, e.g. to only send the
+        latest of several status updates.
+        """
+        self._ensure_started()
+        channel = channel_name(channel)
+        return await self._outbox(channel).put(channel, _single_line(content), key=key)
+
+    async def whisper(self, user, content, *, key=None):
+        # Twitch stopped delivering whispers sent over chat, rather than dropping them silently refuse to send
+        raise InvalidOperationException('Whispers can no longer be sent over chat, send them with Twitch.send_whisper')
+
+    def _ensure_started(self):
+        # Nothing would ever write, or expire, a message queued before the client is started
+        if not self._started:
+            raise InvalidOperationException('The chat client must be connected or started before sending')
+
+    async def send_raw(self, line):
+        await self.connection.send(line)
+
+    async def close(self):
+        self._started = False
+
+        for connection in self.connections:
+            await connection.close()
+
+        if self._owns_transport and not self.transport.closed:
+            await self.transport.close()
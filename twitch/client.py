@@ -4,33 +4,105 @@ import typing
 
 from datetime import datetime
 from .clip import Clip
-from .errors import TwitchException
+from .coordination import SQLiteCoordinator
+from .credentials import Credential, CredentialPool
+from .auth import UserTokenStore
+from .batching import BatchLoader
+from .chat import ChatClient
+from .cache import EntityCache
+from .errors import InvalidOperationException, TwitchException
 from .extension import Extension
 from .follower import Follower
+from .genericutils import chunks
 from .game import Game, PartialGame
+from .iterators import PaginatedIterator
 from .http import HTTPConnection, WSConnection
+from .ratelimit import RateLimiter, Priority
+from .retry import RetryPolicy
 from .stream import Stream
+from .subscription import Subscription
+from .transport import Transport
 from .tags import Tag, PartialTag
 from .transaction import Transaction
 from .video import Video
+from .watcher import StreamWatcher, FollowerWatcher
 from .user import User, PartialUser, BannedPartialUser
 
 
+def _user_key(user):
+    if isinstance(user, (User, PartialUser)):
+        return str(user.id)
+    elif isinstance(user, int) or user.isdigit():
+        return str(user)
+    return user.lower()
+
+
+def _game_key(game):
+    if isinstance(game, (Game, PartialGame)):
+        return str(game.id)
+    # Names are sent as spelled, helix wants the exact title, but matched case insensitively
+    return str(game)
+
+
+def _distinct(keys):
+    # Keys spelled differently still name the same entity, the first spelling is kept
+    ret = {}
+    for key in keys:
+        ret.setdefault(key.lower(), key)
+    return list(ret.values())
+
+
 class Twitch:
-    def __init__(self, client_id, client_secret, *, loop=None, capabilities: list = None):
-        self.app_token = None
+    def __init__(self, client_id, client_secret, *, loop=None, capabilities: list = None, ratelimit_margin: int = 0, background_share: float = 0.5, max_concurrency: int = 10, batch_window: float = 0, cache: EntityCache = None, transport: Transport = None, retry: RetryPolicy = None, json_loads: typing.Callable = None, token_backend=None, credentials: list = None, coordinator: SQLiteCoordinator = None, handle_signals: bool = True):
         self.coros = []
         self.loop = loop or asyncio.get_event_loop()
         self._client_id = client_id
         self._client_secret = client_secret
         self._capabilities = capabilities or []
         self._refresh_token = None
-        self.http = HTTPConnection(self, client_id, self._capabilities, loop=self.loop)
-        self.ws = WSConnection(self, client_id, [], loop=self.loop)
+        # Processes sharing a coordinator also share its entity cache unless given their own
+        self.coordinator = coordinator
+        self.cache = cache or EntityCache(backend=coordinator.cache_backend() if coordinator else None)
+        self._owns_transport = transport is None
+        self.transport = transport or Transport(loop=self.loop)
+        # Additional (client_id, client_secret) pairs to spread the rate limit across
+        self.credentials = CredentialPool(
+            Credential(cid, secret, ratelimit=RateLimiter(margin=ratelimit_margin, background_share=background_share, coordinator=coordinator, key=cid, loop=self.loop))
+            for cid, secret in [(client_id, client_secret)] + list(credentials or [])
+        )
+        self.http = HTTPConnection(self, client_id, self._capabilities, loop=self.loop, credentials=self.credentials,
+                                   max_concurrency=max_concurrency, transport=self.transport, retry=retry,
+                                   json_loads=json_loads)
+        self.http.user_tokens = UserTokenStore(self.http, backend=token_backend, loop=self.loop)
+        self.ws = WSConnection(self, client_id, [], loop=self.loop, transport=self.transport)
+
+        self._user_loader = BatchLoader(self._load_users, lambda user: (user['id'], user['login'].lower()),
+                                        window=batch_window, loop=self.loop)
+        self._game_loader = BatchLoader(self._load_games, lambda game: (game['id'], game['name'].lower()),
+                                        normalize=str.lower, window=batch_window, loop=self.loop)
+        self._stream_loader = BatchLoader(self._load_streams, lambda stream: (stream['user_id'], stream['user_login']),
+                                          window=batch_window, loop=self.loop)
+        self._watchers = []
+        self._chats = []
+
+        # Signal handlers can only be installed from the main thread, e.g. not when the loop runs in a worker thread
+        if handle_signals:
+            self.loop.add_signal_handler(signal.SIGTERM, lambda: self.close())
+            self.loop.add_signal_handler(signal.SIGINT, lambda: self.close())
+
+    @property
+    def ratelimit(self):
+        return self.http.ratelimit
+
+    @property
+    def app_token(self):
+        # Clients created without a secret have no app token
+        return self.http.token.token if self.http.token is not None else None
+
+    @property
+    def user_tokens(self):
+        return self.http.user_tokens
 
-        self.loop.add_signal_handler(signal.SIGTERM, lambda: self.close())
-        self.loop.add_signal_handler(signal.SIGINT, lambda: self.close())
-    
     # https://dev.twitch.tv/docs/api/reference#get-extension-analytics
     async def get_extension_analytics_url(self, extension: typing.Union[str, Extension] = None, limit: int = 20, started_at: datetime = None, ended_at: datetime = None, analytics_type: str = None):
         # TODO
@@ -47,15 +119,11 @@ class Twitch:
         pass
 
     # https://dev.twitch.tv/docs/api/reference#get-extension-transactions
-    async def get_extension_transactions(self, extension: typing.Union[str, Extension], transaction: typing.Union[int, str, Transaction] = None, limit: int = 20):
-        data = await self.http.get_extension_transactions(extension, transaction, limit)
+    def get_extension_transactions(self, extension: typing.Union[str, Extension], transaction: typing.Union[int, str, Transaction] = None, limit: typing.Optional[int] = 20, prefetch: int = 1, priority: int = Priority.Default):
+        async def fetch(first, after):
+            return await self.http.get_extension_transactions(extension, transaction, first, after=after, priority=priority)
 
-        ret = []
-
-        for trans in data['data']:
-            ret.append(Transaction(trans))
-
-        return ret
+        return PaginatedIterator(fetch, lambda data: Transaction(self, data), limit=limit, prefetch=prefetch, loop=self.loop)
 
     # https://dev.twitch.tv/docs/api/reference#create-clip
     async def create_clip(self, stream: typing.Union[int, str, Stream], clip_after_delay: bool = False):
@@ -98,28 +166,24 @@ class Twitch:
         pass
 
     # https://dev.twitch.tv/docs/api/reference#get-games
-    async def get_game(self, game: typing.Union[int, str, Game, PartialGame]):
-        # Alias
-        data = await self.get_games(game)
+    async def get_game(self, game: typing.Union[int, str, Game, PartialGame], priority: int = Priority.Interactive):
+        key = _game_key(game)
 
-        if len(data) < 1:
-            return None
-
-        return data[0]
-
-    # https://dev.twitch.tv/docs/api/reference#get-games
-    async def get_games(self, *games: typing.Union[int, str, Game, PartialGame]):
-        if len(games) > 100:
-            raise TwitchException('Game amount cannot be greater than 100')
+        cached = self.cache.get_game(key)
+        if cached is not None:
+            return cached
 
-        data = await self.http.get_games(games)
+        data = await self._game_loader.load(key, priority)
 
-        ret = []
+        if data is None:
+            return None
 
-        for i in range(len(data['data'])):
-            ret.append(Game(data['data'][i]))
+        return self.cache.put_game(Game(data))
 
-        return ret
+    # https://dev.twitch.tv/docs/api/reference#get-games
+    async def get_games(self, *games: typing.Union[int, str, Game, PartialGame], priority: int = Priority.Default):
+        return await self._lookup([_game_key(g) for g in games], self.cache.get_game, self.cache.put_game,
+                                  self._fetch_games, lambda game: (game['id'], game['name'].lower()), Game, priority)
 
     # https://dev.twitch.tv/docs/api/reference#check-automod-status
     async def are_messages_allowed(self, stream: typing.Union[int, str, Stream], *messages: str):
@@ -152,30 +216,40 @@ class Twitch:
         return await self.get_banned_events(stream, for_users=for_users)
 
     # https://dev.twitch.tv/docs/api/reference#get-streams
-    async def get_stream(self, user: typing.Union[int, str, User, PartialUser, BannedPartialUser]):
-        data = await self.http.get_stream(user)
+    async def get_stream(self, user: typing.Union[int, str, User, PartialUser, BannedPartialUser], priority: int = Priority.Interactive):
+        key = _user_key(user)
+
+        cached = self.cache.get_stream(key)
+        if cached is not None:
+            return cached
 
-        if len(data['data']) < 1:
+        data = await self._stream_loader.load(key, priority)
+
+        if data is None:
             return None
 
-        return Stream(self, data['data'][0])
+        return self.cache.put_stream(Stream(self, data))
 
     # https://dev.twitch.tv/docs/api/reference#get-streams
-    async def get_streams(self, users: typing.Union[int, str, User, PartialUser, BannedPartialUser] = None, games: typing.Union[int, str, Game, PartialGame] = None, language: str = 'en', limit: int = 20):
-        if users and len(users) > 100:
-            raise TwitchException('User amount cannot exceed 100')
-
-        if games and len(games) > 100:
-            raise TwitchException('Game amount cannot exceed 100')
+    def get_streams(self, users: typing.Union[int, str, User, PartialUser, BannedPartialUser] = None, games: typing.Union[int, str, Game, PartialGame] = None, language: str = 'en', limit: typing.Optional[int] = 20, prefetch: int = 1, priority: int = Priority.Background):
+        user_chunks = list(chunks(users)) if type(users) in (tuple, list) and len(users) > 100 else [users]
+        game_chunks = list(chunks(games)) if type(games) in (tuple, list) and len(games) > 100 else [games]
 
-        data = await self.http.get_streams(users, games, language, limit)
+        def source(users, games):
+            async def fetch(first, after):
+                return await self.http.get_streams(users, games, language, first, after=after, priority=priority)
+            return fetch
 
-        ret = []
+        sources = [source(u, g) for u in user_chunks for g in game_chunks]
 
-        for s in data['data']:
-            ret.append(Stream(self, s))
+        return PaginatedIterator(sources, lambda data: self.cache.put_stream(Stream(self, data)), limit=limit, prefetch=prefetch, loop=self.loop)
 
-        return ret
+    # https://dev.twitch.tv/docs/api/reference#get-streams
+    def watch_streams(self, *users: typing.Union[int, str, User, PartialUser, BannedPartialUser], interval: float = 60, max_interval: float = None, budget: float = 0.5, priority: int = Priority.Background, initial_events: bool = False):
+        watcher = StreamWatcher(self, users, interval=interval, max_interval=max_interval, budget=budget, priority=priority,
+                                initial_events=initial_events, loop=self.loop)
+        self._watchers.append(watcher)
+        return watcher.start()
 
     # https://dev.twitch.tv/docs/api/reference#get-streams-metadata
     async def get_streams_metadata(self, users: typing.Union[int, str, User, PartialUser, BannedPartialUser] = None, games: typing.Union[int, str, Game, PartialGame] = None, language: str = 'en', limit: int = 20):
@@ -198,9 +272,11 @@ class Twitch:
         pass
 
     # https://dev.twitch.tv/docs/api/reference#get-broadcaster-subscriptions
-    async def get_subscriptions(self, user: typing.Union[int, str, Stream, User, PartialUser, BannedPartialUser], for_users: typing.Union[int, str, User, PartialUser, BannedPartialUser] = None):
-        # TODO
-        pass
+    def get_subscriptions(self, user: typing.Union[int, str, Stream, User, PartialUser, BannedPartialUser], for_users: typing.Union[int, str, User, PartialUser, BannedPartialUser] = None, limit: typing.Optional[int] = 20, prefetch: int = 1, priority: int = Priority.Default):
+        async def fetch(first, after):
+            return await self.http.get_subscriptions(user, for_users, first, after=after, priority=priority)
+
+        return PaginatedIterator(fetch, lambda data: Subscription(self, data), limit=limit, prefetch=prefetch, loop=self.loop)
 
     # https://dev.twitch.tv/docs/api/reference#get-all-stream-tags
     async def get_all_stream_tags(self, limit: int = 20):
@@ -228,49 +304,50 @@ class Twitch:
         pass
 
     # https://dev.twitch.tv/docs/api/reference#get-users
-    async def get_user(self, user: typing.Union[int, str, User, PartialUser, BannedPartialUser]):
-        data = await self.get_users(user)
-
-        if len(data) < 1:
-            return None
-
-        return data[0]
+    async def get_user(self, user: typing.Union[int, str, User, PartialUser, BannedPartialUser], priority: int = Priority.Interactive):
+        key = _user_key(user)
 
-    # https://dev.twitch.tv/docs/api/reference#get-users
-    async def get_users(self, *users: typing.Union[int, str, User, PartialUser, BannedPartialUser]):
-        if len(users) > 100:
-            raise TwitchException('User amount cannot be greater than 100')
+        cached = self.cache.get_user(key)
+        if cached is not None:
+            return cached
 
-        data = await self.http.get_users(users)
+        data = await self._user_loader.load(key, priority)
 
-        ret = []
+        if data is None:
+            return None
 
-        for i in range(len(data['data'])):
-            ret.append(User(self, data['data'][i]))
+        return self.cache.put_user(User(self, data))
 
-        return ret
+    # https://dev.twitch.tv/docs/api/reference#get-users
+    async def get_users(self, *users: typing.Union[int, str, User, PartialUser, BannedPartialUser], priority: int = Priority.Default):
+        return await self._lookup([_user_key(u) for u in users], self.cache.get_user, self.cache.put_user,
+                                  self._fetch_users, lambda user: (user['id'], user['login'].lower()),
+                                  lambda data: User(self, data), priority)
 
     # https://dev.twitch.tv/docs/api/reference#get-users-follows
-    async def get_followers(self, user: typing.Union[int, str, Stream, User, PartialUser, BannedPartialUser], limit: int = 20):
-        data = await self.http.get_follows(to=user, limit=limit)
+    def get_followers(self, user: typing.Union[int, str, Stream, User, PartialUser, BannedPartialUser], limit: typing.Optional[int] = 20, prefetch: int = 1, priority: int = Priority.Background):
+        async def fetch(first, after):
+            return await self.http.get_follows(to=user, limit=first, after=after, priority=priority)
 
-        ret = []
-
-        for user in data['data']:
-            ret.append(Follower(self, user))
-
-        return ret
+        return PaginatedIterator(fetch, lambda data: Follower(self, data), limit=limit, prefetch=prefetch, loop=self.loop)
 
     # https://dev.twitch.tv/docs/api/reference#get-users-follows
-    async def get_followings(self, user: typing.Union[int, str, Stream, User, PartialUser, BannedPartialUser], limit: int = 20):
-        data = await self.http.get_follows(_from=user, limit=limit)
+    def get_followings(self, user: typing.Union[int, str, Stream, User, PartialUser, BannedPartialUser], limit: typing.Optional[int] = 20, prefetch: int = 1, priority: int = Priority.Background):
+        async def fetch(first, after):
+            return await self.http.get_follows(_from=user, limit=first, after=after, priority=priority)
 
-        ret = []
+        return PaginatedIterator(fetch, lambda data: Follower(self, data), limit=limit, prefetch=prefetch, loop=self.loop)
 
-        for user in data['data']:
-            ret.append(Follower(self, user))
+    # https://dev.twitch.tv/docs/api/reference#get-users-follows
+    def watch_followers(self, *users: typing.Union[int, str, Stream, User, PartialUser, BannedPartialUser], interval: float = 60, max_interval: float = None, budget: float = 0.25, priority: int = Priority.Background, checkpoints=None, backfill: bool = False):
+        watcher = FollowerWatcher(self, users, interval=interval, max_interval=max_interval, budget=budget, priority=priority,
+                                  checkpoints=checkpoints, backfill=backfill, loop=self.loop)
+        self._watchers.append(watcher)
+        return watcher.start()
 
-        return ret
+    # https://dev.twitch.tv/docs/api/reference#send-whisper
+    async def send_whisper(self, sender: typing.Union[int, str, User, PartialUser, BannedPartialUser], to: typing.Union[int, str, User, PartialUser, BannedPartialUser], message: str, priority: int = Priority.Interactive):
+        await self.http.send_whisper(sender, to, message, priority=priority)
 
     # https://dev.twitch.tv/docs/api/reference#update-user
     async def update_description(self, user: typing.Union[int, str, User, PartialUser, BannedPartialUser], description: str):
@@ -314,6 +391,116 @@ class Twitch:
         # TODO
         pass
 
+    async def _fetch_chunked(self, fetch, keys, match, priority):
+        # Lookups are limited to 100 ids per request, split them and merge the results back in input order
+        keys = _distinct(keys)
+        responses = await asyncio.gather(*(fetch(chunk, priority) for chunk in chunks(keys)))
+
+        found = {}
+        for data in responses:
+            for item in data['data']:
+                for key in match(item):
+                    found[key] = item
+
+        ret = []
+        seen = set()
+        for key in keys:
+            item = found.get(key.lower())
+            if item is not None and item['id'] not in seen:
+                seen.add(item['id'])
+                ret.append(item)
+
+        # Keep whatever helix returned that none of our keys spelled the same way
+        for data in responses:
+            for item in data['data']:
+                if item['id'] not in seen:
+                    seen.add(item['id'])
+                    ret.append(item)
+
+        return ret
+
+    async def _lookup(self, keys, get, put, fetch, match, build, priority):
+        # Answer what we can from the entity cache and only request the misses
+        keys = _distinct(keys)
+        found = {key.lower(): get(key) for key in keys}
+        missing = [key for key in keys if found[key.lower()] is None]
+
+        fetched = []
+        if missing:
+            for data in await self._fetch_chunked(fetch, missing, match, priority):
+                obj = put(build(data))
+                fetched.append(obj)
+                for key in match(data):
+                    found[key] = obj
+
+        ret = []
+        seen = set()
+        for key in keys:
+            obj = found.get(key.lower())
+            if obj is not None and obj.id not in seen:
+                seen.add(obj.id)
+                ret.append(obj)
+
+        for obj in fetched:
+            if obj.id not in seen:
+                seen.add(obj.id)
+                ret.append(obj)
+
+        return ret
+
+    # Single lookups made by concurrent tasks are coalesced by the loaders into these batched requests
+    async def _load_users(self, keys, priority):
+        return (await self._fetch_users(keys, priority))['data']
+
+    async def _load_games(self, keys, priority):
+        return (await self._fetch_games(keys, priority))['data']
+
+    async def _fetch_users(self, keys, priority):
+        return await self._fetch_persisted('user', self.http.get_users, keys, lambda user: (user['id'], user['login'].lower()), priority)
+
+    async def _fetch_games(self, keys, priority):
+        return await self._fetch_persisted('game', self.http.get_games, keys, lambda game: (game['id'], game['name'].lower()), priority)
+
+    async def _fetch_persisted(self, kind, fetch, keys, match, priority):
+        # Consult the persistent cache backend, if any, before requesting the remaining keys
+        backend = self.cache.backend
+        if backend is None:
+            return await fetch(keys, priority)
+
+        stored = await backend.get_many(kind, [key.lower() for key in keys])
+        items = list({data['id']: data for data in stored.values()}.values())
+        found = {key for data in items for key in match(data)}
+        missing = [key for key in keys if key.lower() not in found]
+
+        if missing:
+            fresh = (await fetch(missing, priority))['data']
+            await backend.put_many(kind, [(match(data), data) for data in fresh], self.cache.ttl(kind))
+            items.extend(fresh)
+
+        return {'data': items}
+
+    async def _load_streams(self, keys, priority):
+        async def fetch(keys, priority):
+            return await self.http.get_streams(keys, None, None, 100, priority=priority)
+
+        return (await self._fetch_persisted('stream', fetch, keys, lambda stream: (stream['user_id'], stream['user_login']),
+                                            priority))['data']
+
+    @property
+    def chat(self):
+        # The chat client streams and users send their messages with, the first one able to send
+        for chat in self._chats:
+            if not chat.anonymous:
+                return chat
+        raise InvalidOperationException('Sending requires a chat client created with a token, see create_chat')
+
+    # https://dev.twitch.tv/docs/irc
+    def create_chat(self, nick: str = None, token: str = None, **kwargs):
+        # Chat clients share the client's transport, without a token they join anonymously and can only read
+        chat = ChatClient(nick, token, transport=self.transport, loop=self.loop, **kwargs)
+        self._chats.append(chat)
+        return chat
+
     # Temporary solution until actual coroutine running is setup
     def run_coro(self, coro):
         return self.loop.run_until_complete(coro)
@@ -321,9 +508,38 @@ class Twitch:
     def run_coro_on_start(self, coro):
         self.coros.append(coro)
 
+    def _release(self):
+        for watcher in self._watchers:
+            watcher.close()
+
+        for credential in self.credentials:
+            if credential.token is not None:
+                credential.token.close()
+
+        if self.cache.backend:
+            self.cache.backend.close()
+
+        if self.coordinator:
+            self.coordinator.close()
+
+    async def shutdown(self):
+        # Release every resource of the client but leave the loop running, for loops owned by someone else
+        self._release()
+
+        for chat in self._chats:
+            await chat.close()
+
+        if self._owns_transport and not self.transport.closed:
+            await self.transport.close()
+
     def close(self):
-        if not self.http.is_closed():
-            asyncio.run_coroutine_threadsafe(self.http.close(), self.loop)
+        self._release()
+
+        for chat in self._chats:
+            asyncio.run_coroutine_threadsafe(chat.close(), self.loop)
+
+        if self._owns_transport and not self.transport.closed:
+            asyncio.run_coroutine_threadsafe(self.transport.close(), self.loop)
 
         if self.loop.is_running():
             self.loop.stop()
@@ -338,22 +554,16 @@ class Twitch:
             self.loop.run_forever()
 
     async def _start(self):
-        res = await self.http.rrequest('POST', f'https://id.twitch.tv/oauth2/token?client_id={self._client_id}' +
-                                               f'&client_secret={self._client_secret}&grant_type=client_credentials' +
-                                               f'&scope={" ".join(self._capabilities)}')
-
-        self.app_token = res['access_token']
+        if self.http.token is not None:
+            await self.http.token.get()
 
         for coro in self.coros:
             await coro
 
     async def refresh_app_token(self):
-        # TODO: add try/except unauthorized to http methods
-        res = await self.http.request('POST', f'https://id.twitch.tv/oauth2/token?client_id={self._client_id}' +
-                                              f'&client_secret={self._client_secret}&grant_type=client_credentials' +
-                                              f'&scope={" ".join(self._capabilities)}')
-
-        self.app_token = res['access_token']
+        if self.http.token is None:
+            return None
+        return await self.http.token.refresh()
 
     def is_closed(self):
         return self.loop.is_closed()
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import sqlite3
+import time
+
+from .cache import SQLiteCacheBackend
+from .sqlite import SQLiteDatabase
+
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteCoordinator:
+    """
+    Defines a sqlite file through which processes on one host share rate limit budgets and cached entities
+
+    Every process pointing at the same file draws points from the same buckets, so together they respect the limit
+    of each client id. Reservations are taken in immediate transactions on a WAL journal, which serializes writers
+    across processes without blocking readers.
+    """
+
+    def __init__(self, path, *, busy_timeout=5, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._path = path
+        self._sqlite = SQLiteDatabase(path, 'CREATE TABLE IF NOT EXISTS buckets ('
+                                            'key TEXT PRIMARY KEY, bucket_limit INTEGER NOT NULL, '
+                                            'remaining INTEGER NOT NULL, reset_at REAL NOT NULL)',
+                                      timeout=busy_timeout, isolation_level=None, loop=self.loop)
+        self._db = self._sqlite.connection
+
+    def __repr__(self):
+        return f"<SQLiteCoordinator - path:{self._path}>"
+
+    @property
+    def path(self):
+        return self._path
+
+    def cache_backend(self, **kwargs):
+        return SQLiteCacheBackend(self._path, loop=self.loop, **kwargs)
+
+    def _reserve(self, key, limit, period):
+        now = time.time()
+
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            row = self._db.execute('SELECT remaining, reset_at FROM buckets WHERE key = ?', (key,)).fetchone()
+
+            if row is None or row[1] <= now:
+                remaining, reset_at = limit, now + period
+            else:
+                remaining, reset_at = row
+
+            if remaining > 0:
+                remaining -= 1
+                wait = 0.0
+            else:
+                wait = reset_at - now
+
+            self._db.execute('INSERT OR REPLACE INTO buckets (key, bucket_limit, remaining, reset_at) VALUES (?, ?, ?, ?)',
+                             (key, limit, remaining, reset_at))
+            self._db.execute('COMMIT')
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+
+        return wait
+
+    def _observe(self, key, limit, remaining, reset_at):
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            row = self._db.execute('SELECT remaining, reset_at FROM buckets WHERE key = ?', (key,)).fetchone()
+
+            # Until the shared window resets our reservations may be ahead of what the API has seen, keep the lower count
+            if row is not None and row[1] > time.time():
+                remaining = min(remaining, row[0])
+
+            self._db.execute('INSERT OR REPLACE INTO buckets (key, bucket_limit, remaining, reset_at) VALUES (?, ?, ?, ?)',
+                             (key, limit, remaining, reset_at))
+            self._db.execute('COMMIT')
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+
+    async def reserve(self, key, limit, period):
+        return await self._sqlite.run(self._reserve, key, limit, period)
+
+    async def observe(self, key, limit, remaining, reset_at):
+        # Responses may still arrive while the client shuts down, there is nothing left to share them with
+        if self._sqlite.closed:
+            return
+
+        try:
+            await self._sqlite.run(self._observe, key, limit, remaining, reset_at)
+        except sqlite3.Error as e:
+            logger.warning(f'Failed to share rate limit state for {key}: {e}')
+
+    def close(self):
+        self._sqlite.close()
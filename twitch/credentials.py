@@ -0,0 +1,67 @@
+class Credential:
+    """
+    Defines a client id and secret together with its app token and rate limit bucket
+    """
+
+    __slots__ = ('_client_id', '_client_secret', 'ratelimit', 'token')
+
+    def __init__(self, client_id, client_secret=None, *, ratelimit=None, token=None):
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self.ratelimit = ratelimit
+        self.token = token
+
+    def __repr__(self):
+        return f"<Credential - client_id:{self._client_id} available:{self.ratelimit.available if self.ratelimit else None}>"
+
+    @property
+    def client_id(self):
+        return self._client_id
+
+    @property
+    def client_secret(self):
+        return self._client_secret
+
+
+class CredentialPool:
+    """
+    Defines the credentials helix requests are spread across
+
+    Rate limits are tracked per client id, so each request is sent with the credential that has the most budget
+    left. Requests made with a user token are pinned to the credential that token was issued to.
+    """
+
+    def __init__(self, credentials):
+        self._credentials = list(credentials)
+        self._by_id = {credential.client_id: credential for credential in self._credentials}
+
+    def __repr__(self):
+        return f"<CredentialPool - {' '.join(c.client_id for c in self._credentials)}>"
+
+    def __iter__(self):
+        return iter(self._credentials)
+
+    def __len__(self):
+        return len(self._credentials)
+
+    def __contains__(self, client_id):
+        return client_id in self._by_id
+
+    @property
+    def primary(self):
+        return self._credentials[0]
+
+    @property
+    def budget(self):
+        return {credential.client_id: credential.ratelimit.budget for credential in self._credentials}
+
+    def get(self, client_id=None):
+        if client_id is None:
+            return self.primary
+        return self._by_id.get(client_id)
+
+    def select(self):
+        if len(self._credentials) == 1:
+            return self.primary
+
+        return max(self._credentials, key=lambda c: (c.ratelimit.available, -c.ratelimit.queued))
@@ -51,3 +51,25 @@ class InvalidOperationException(TwitchException):
     If thrown, the user should check assumptions prior to the call
     """
     pass
+
+
+class HTTPException(TwitchException):
+    """
+    Exception thrown when the API responds to a request with an unsuccessful status
+
+    If thrown, the status and reason describe what the API rejected
+    """
+
+    def __init__(self, status, reason, message=None):
+        self.status = status
+        self.reason = reason
+        super().__init__(f'{status} {reason}' + (f': {message}' if message else ''))
+
+
+class CircuitOpenException(TwitchException):
+    """
+    Exception thrown when a request is made to an endpoint that has been failing persistently
+
+    If thrown, the endpoint should be retried after the circuit breaker's recovery timeout
+    """
+    pass
@@ -0,0 +1,93 @@
+import asyncio
+import collections
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class EventDispatcher:
+    """
+    Defines a registry of coroutine handlers that events are dispatched to
+
+    Handlers are registered under `on_<event>`, either with the `event` decorator using the handler's own name or with
+    `listen`/`add_listener` under an explicit name. Every handler runs in its own task, so a slow or failing handler
+    never holds up the dispatcher or the other handlers.
+    """
+
+    def __init__(self, *, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._listeners = collections.defaultdict(list)
+        self._waiters = collections.defaultdict(list)
+
+    def event(self, coro):
+        if not asyncio.iscoroutinefunction(coro):
+            raise TypeError(f'Event handler {coro!r} must be a coroutine function')
+
+        self.add_listener(coro, coro.__name__)
+        return coro
+
+    def listen(self, name=None):
+        def decorator(coro):
+            self.add_listener(coro, name or coro.__name__)
+            return coro
+        return decorator
+
+    def add_listener(self, coro, name=None):
+        name = name or coro.__name__
+        if not name.startswith('on_'):
+            name = f'on_{name}'
+
+        self._listeners[name].append(coro)
+
+    def remove_listener(self, coro, name=None):
+        name = name or coro.__name__
+        if not name.startswith('on_'):
+            name = f'on_{name}'
+
+        if coro in self._listeners[name]:
+            self._listeners[name].remove(coro)
+
+    def listeners(self, event):
+        return list(self._listeners.get(f'on_{event}', ()))
+
+    def has_listeners(self, event):
+        return bool(self._listeners.get(f'on_{event}')) or bool(self._waiters.get(event))
+
+    def dispatch(self, event, *args):
+        for coro in self._listeners.get(f'on_{event}', ()):
+            self.loop.create_task(self._handle(coro, event, args))
+
+        waiters = self._waiters.get(event)
+        if waiters:
+            for waiter in list(waiters):
+                future, check = waiter
+
+                if future.done():
+                    waiters.remove(waiter)
+                    continue
+
+                try:
+                    matched = check is None or check(*args)
+                except Exception as e:
+                    waiters.remove(waiter)
+                    future.set_exception(e)
+                    continue
+
+                if matched:
+                    waiters.remove(waiter)
+                    future.set_result(args[0] if len(args) == 1 else args)
+
+    async def _handle(self, coro, event, args):
+        try:
+            await coro(*args)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f'Handler {coro.__name__} for event {event} raised')
+
+    async def wait_for(self, event, check=None, timeout=None):
+        future = self.loop.create_future()
+        self._waiters[event].append((future, check))
+
+        return await asyncio.wait_for(future, timeout)
@@ -10,3 +10,10 @@ def get_datetime_from(value, filter='%Y-%m-%dT%H:%M:%SZ'):
 
 def get_default_timestamp():
     return datetime.utcfromtimestamp(0)
+
+
+def chunks(values, size=100):
+    values = list(values)
+
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
@@ -1,10 +1,18 @@
 import aiohttp
 import asyncio
+import json
 import logging
 
-from .errors import TwitchException
+from .errors import TwitchException, HTTPException, NotAuthorizedException, CircuitOpenException
 from .extension import Extension
 from .game import Game, PartialGame
+from .query import Query, as_list
+from .auth import AppTokenManager, UserTokenStore, scope_names
+from .credentials import Credential, CredentialPool
+from .ratelimit import RateLimiter, Priority
+from .scope import Scope
+from .retry import RetryPolicy, CircuitBreaker
+from .transport import Transport
 from .stream import Stream
 from .transaction import Transaction
 from .user import User, PartialUser, BannedPartialUser
@@ -12,16 +20,48 @@ from .user import User, PartialUser, BannedPartialUser
 
 logger = logging.getLogger(__name__)
 
+USER_TYPES = (User, PartialUser, BannedPartialUser)
+GAME_TYPES = (Game, PartialGame)
+
+try:
+    import orjson
+    default_json_loads = orjson.loads
+except ImportError:
+    default_json_loads = json.loads
+
 
 class HTTPConnection:
     BASE = 'https://api.twitch.tv/helix'
 
-    def __init__(self, client, client_id, scopes, *, loop=None):
+    def __init__(self, client, client_id, scopes, *, loop=None, ratelimit=None, max_concurrency=10, transport=None, retry=None,
+                 json_loads=None, credentials=None):
         self._client = client
         self.loop = loop or asyncio.get_event_loop()
         self._client_id = client_id
         self._scopes = scopes
-        self._session = aiohttp.ClientSession(loop=loop)
+        self._owns_transport = transport is None
+        self.transport = transport or Transport(loop=self.loop)
+        self.credentials = credentials or CredentialPool([Credential(client_id, ratelimit=ratelimit)])
+        self._concurrency = asyncio.Semaphore(max_concurrency)
+        self.retry = retry or RetryPolicy()
+        self.json_loads = json_loads or default_json_loads
+        self._breakers = {}
+        self.user_tokens = UserTokenStore(self, loop=self.loop)
+        self._inflight = {}
+
+        for credential in self.credentials:
+            if credential.ratelimit is None:
+                credential.ratelimit = RateLimiter(loop=self.loop)
+            if credential.token is None and credential.client_secret:
+                credential.token = AppTokenManager(self, credential.client_id, credential.client_secret, scopes, loop=self.loop)
+
+    @property
+    def ratelimit(self):
+        return self.credentials.primary.ratelimit
+
+    @property
+    def token(self):
+        return self.credentials.primary.token
 
     async def rrequest(self, method, url, **kwargs):
         res = await self._session.request(method, url, **kwargs)
@@ -29,187 +69,269 @@ class HTTPConnection:
         if res.status != 200:
             logger.warning(f'RRequest returned status {res.status} with reason: {res.reason}')
 
+        body = await res.read()
+
         try:
-            return await res.json()
-        except:
-            return await res.text()
+            return self.json_loads(body)
+        except ValueError:
+            return body.decode(res.charset or 'utf-8', errors='replace')
+
+    def breaker(self, url):
+        endpoint = url.split('?', 1)[0].rstrip('/')
+
+        if endpoint not in self._breakers:
+            self._breakers[endpoint] = CircuitBreaker()
 
-    async def request(self, method, url, **kwargs):
+        return self._breakers[endpoint]
+
+    @staticmethod
+    def _retry_after(res):
+        try:
+            return float(res.headers['Retry-After'])
+        except (KeyError, ValueError):
+            return None
+
+    async def request(self, method, url, *, params=None, raw=False, user=None, scopes=(), priority=Priority.Default, client_id=None, **kwargs):
+        if method.upper() != 'GET':
+            return await self._request(method, url, params=params, raw=raw, user=user, scopes=scopes, priority=priority,
+                                       client_id=client_id, **kwargs)
+
+        # Identical GETs already in flight share one response, callers build their own models from it
+        key = (url.rstrip('/'), params.key if isinstance(params, Query) else params, raw, priority, client_id,
+               getattr(user, 'id', user), frozenset(scope_names(scopes)),
+               tuple(sorted(kwargs.get('headers', {}).items())))
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = self.loop.create_task(
+                self._request(method, url, params=params, raw=raw, user=user, scopes=scopes, priority=priority,
+                              client_id=client_id, **kwargs))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        return await asyncio.shield(task)
+
+    async def _request(self, method, url, *, params=None, raw=False, user=None, scopes=(), priority=Priority.Default, client_id=None, **kwargs):
         headers = kwargs.pop('headers', {})
+        payload = kwargs.pop('json', None)
+
+        # Act with the user's token when acting on their behalf, otherwise attach an app token
+        # unless the caller authorizes the request itself. User tokens only work with the client id they were issued to
+        pinned = None
+        user_token = None
+        authorize = 'Authorization' not in headers
+        if client_id is not None:
+            pinned = self.credentials.get(client_id)
+            if pinned is None:
+                raise TwitchException(f'Client ID {client_id} is not one of the configured credentials')
+        if user is not None:
+            user_token = await self.user_tokens.require(getattr(user, 'id', user), *scopes)
+            headers.update(user_token.headers)
+            pinned = self.credentials.get(user_token.client_id) or self.credentials.primary
+            authorize = False
+        elif not authorize:
+            pinned = pinned or self.credentials.primary
+
+        breaker = self.breaker(url)
+        if not breaker.allow():
+            raise CircuitOpenException(f'Endpoint {url.split("?", 1)[0]} is failing, retry in {breaker.retry_in:.0f}s')
+
+        # A trial that ends without telling whether the endpoint recovered, e.g. rate limited or cancelled, must not
+        # leave the circuit half open for good
+        trial = breaker.state == CircuitBreaker.HalfOpen
+        try:
+            res, body = await self._send(method, url, params, payload, headers, pinned, authorize, user_token, priority, breaker)
+        finally:
+            if trial:
+                breaker.release()
+
+        if res.status in (401, 403):
+            raise NotAuthorizedException(f'Request to {url} returned status {res.status}: {body.decode(errors="replace")}')
+        elif not 200 <= res.status < 300:
+            raise HTTPException(res.status, res.reason, body.decode(errors='replace'))
+        elif res.status == 204:
+            return None
+
+        # Decode once from the raw body, raw callers forwarding payloads skip decoding entirely
+        if raw:
+            return body
+
+        return self.json_loads(body)
+
+    async def _send(self, method, url, params, payload, headers, pinned, authorize, user_token, priority, breaker):
+        # Sends the request, retrying and refreshing tokens as needed, and returns the final response and its body
+        refreshed = False
+        attempt = 0
+        timeout = aiohttp.ClientTimeout(total=self.retry.timeout)
+
+        while True:
+            # Spread requests over the credential with the most budget left
+            credential = pinned or self.credentials.select()
+            ratelimit = credential.ratelimit
+            headers['Client-ID'] = credential.client_id
+
+            app_token = None
+            if authorize and credential.token:
+                app_token = await credential.token.get()
+                headers.update(credential.token.headers)
+
+            # Wait for rate limit budget before taking a connection slot, so queued background
+            # requests never hold slots that interactive requests could use
+            await ratelimit.acquire(priority)
+
+            try:
+                async with self._concurrency:
+                    res = await self._session.request(method, f'{self.BASE}{url}{params or ""}', json=payload, headers=headers,
+                                                      timeout=timeout)
+                    body = await res.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                ratelimit.release()
+                breaker.record_failure()
+
+                if breaker.allow() and self.retry.can_retry(method, attempt):
+                    delay = self.retry.backoff(attempt)
+                    logger.warning(f'Request to {url} failed with {e!r}, retrying in {delay:.2f}s')
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+
+                raise HTTPException(0, type(e).__name__, str(e)) from e
+            except BaseException:
+                ratelimit.release()
+                raise
+
+            ratelimit.release(res.headers)
+
+            if res.status == 401 and app_token is not None and not refreshed:
+                # The app token was revoked or expired early, every request that saw it fail shares one refresh
+                logger.warning(f'Request to {url} was unauthorized, refreshing the app token of {credential.client_id}')
+                await credential.token.refresh(stale=app_token)
+                refreshed = True
+                continue
 
-        headers['Client-ID'] = self._client_id
+            if res.status == 401 and user_token is not None and user_token.refresh_token and not refreshed:
+                logger.warning(f'Request to {url} was unauthorized, refreshing the token of user {user_token.user_id}')
+                user_token = await self.user_tokens.refresh(user_token.user_id, stale=user_token.access_token)
+                headers.update(user_token.headers)
+                refreshed = True
+                continue
 
-        res = await self._session.request(method, f'{self.BASE}{url}', headers=headers)
+            if res.status == 429:
+                # Our view of the bucket was wrong, requeue until a bucket refills
+                ratelimit.exhaust()
 
-        if res.status != 200:
-            logger.warning(f'Request returned status {res.status} with reason: {res.reason}')
+                if self.retry.can_retry(method, attempt, rate_limited=True):
+                    logger.warning(f'Request to {url} was rate limited, requeueing')
+                    attempt += 1
+                    retry_after = self._retry_after(res)
+                    if retry_after:
+                        await asyncio.sleep(retry_after)
+                    continue
+
+                raise HTTPException(res.status, res.reason)
+
+            if res.status >= 500:
+                breaker.record_failure()
+
+                if breaker.allow() and self.retry.can_retry(method, attempt):
+                    delay = self.retry.backoff(attempt, self._retry_after(res))
+                    logger.warning(f'Request to {url} returned status {res.status}, retrying in {delay:.2f}s')
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+
+                raise HTTPException(res.status, res.reason)
 
-        return await res.json()
+            breaker.record_success()
+            return res, body
+
+    @property
+    def _session(self):
+        return self.transport.session
 
     async def close(self):
-        if self._session:
-            await self._session.close()
+        if self._owns_transport:
+            await self.transport.close()
 
-    async def get_users(self, users):
-        params = ''
+    async def get_users(self, users, priority=Priority.Default):
+        return await self.request('GET', '/users', params=Query().identifiers(users, 'id', 'login', USER_TYPES),
+                                  priority=priority)
 
-        if isinstance(users[0], str) and not users[0].isdigit():
-            params += f'?login={users[0]}'
-        elif isinstance(users[0], int) or users[0].isdigit():
-            params += f'?id={users[0]}'
+    async def get_games(self, games, priority=Priority.Default):
+        return await self.request('GET', '/games', params=Query().identifiers(games, 'id', 'name', GAME_TYPES),
+                                  priority=priority)
 
-        for u in users:
-            # Skip over first user as its already provided in params
-            if users.index(u) == 0:
-                continue
+    async def get_stream(self, user, priority=Priority.Default):
+        return await self.request('GET', '/streams', params=Query().identifiers(user, 'user_id', 'user_login', USER_TYPES),
+                                  priority=priority)
 
-            if isinstance(u, str) and not u.isdigit():
-                params += f'&login={u}'
-            elif isinstance(u, int) or u.isdigit():
-                params += f'&id={u}'
-
-        return await self.request('GET', f'/users{params}')
-
-    async def get_games(self, games):
-        params = ''
-
-        if isinstance(games[0], str) and not games[0].isdigit():
-            params += f'?name={games[0]}'
-        elif isinstance(games[0], int) or games[0].isdigit():
-            params += f'?id={games[0]}'
-
-        for g in games[1:]:
-            if isinstance(g, str) and not g.isdigit():
-                params += f'&name={g}'
-            elif isinstance(g, int) or g.isdigit():
-                params += f'&id={g}'
-
-        return await self.request('GET', f'/games{params}')
-
-    async def get_stream(self, user):
-        if isinstance(user, (User, PartialUser, BannedPartialUser)):
-            return await self.request('GET', f'/streams/?user_id={user.id}')
-
-        if isinstance(user, str) and not user.isdigit():
-            return await self.request('GET', f'/streams/?user_login={user}')
-        elif isinstance(user, int) or user.isdigit():
-            return await self.request('GET', f'/streams/?user_id={user}')
-
-    async def get_streams(self, users, games, langs, limit):
-        params = f'?first={limit}'
-
-        if type(langs) in (tuple, list):
-            for lang in langs:
-                params += f'&language={lang}'
-        else:
-            params += f'&language={langs}'
-
-        if users:
-            if type(users) in (tuple, list):
-                for user in users:
-                    if isinstance(user, (User, PartialUser, BannedPartialUser)):
-                        params += f'&user_id={user.id}'
-                    elif isinstance(user, str) and not user.isdigit():
-                        params += f'&user_login={user}'
-                    elif isinstance(user, int) or user.isdigit():
-                        params += f'&user_id={user}'
-            else:
-                if isinstance(users, (User, PartialUser, BannedPartialUser)):
-                    params += f'&user_id={users.id}'
-                elif isinstance(users, str) and not users.isdigit():
-                    params += f'&user_login={users}'
-                elif isinstance(users, int) or users.isdigit():
-                    params += f'&user_id={users}'
-
-        if games:
-            if type(games) in (tuple, list):
-                for game in games:
-                    if isinstance(game, (Game, PartialGame)):
-                        params += f'&game_id={game.id}'
-                    else:
-                        params += f'&game_id={game}'
-            else:
-                if isinstance(games, (Game, PartialGame)):
-                    params += f'&game_id={games.id}'
-                else:
-                    params += f'&game_id={games}'
-
-        return await self.request('GET', f'/streams{params}')
+    async def get_streams(self, users, games, langs, limit, after=None, priority=Priority.Default):
+        query = Query(('first', limit), ('after', after))
+        query.extend('language', langs)
+        query.identifiers(users, 'user_id', 'user_login', USER_TYPES)
+        query.identifiers(games, 'game_id', types=GAME_TYPES)
+
+        return await self.request('GET', '/streams', params=query, priority=priority)
 
     async def get_stream_tags(self, tags, limit):
         # TODO
         pass
 
-    async def get_follows(self, *, to=None, _from=None, limit):
-        if to:
-            if isinstance(to, (User, PartialUser, BannedPartialUser)):
-                return await self.request('GET', f'/users/follows?first={limit}&to_id={to.id}')
-            elif isinstance(to, int) or to.isdigit():
-                return await self.request('GET', f'/users/follows?first={limit}&to_id={to}')
+    async def get_subscriptions(self, broadcaster, users, limit, after=None, priority=Priority.Default):
+        # Read with the broadcaster's own token, which needs the channel:read:subscriptions scope
+        if isinstance(broadcaster, Stream):
+            broadcaster = broadcaster.broadcaster
+
+        query = Query()
+        query.identifiers(broadcaster, 'broadcaster_id', types=USER_TYPES)
+        query.identifiers(users, 'user_id', types=USER_TYPES)
+        query.add('first', limit)
+        query.add('after', after)
 
-        if _from:
-            if isinstance(_from, (User, PartialUser, BannedPartialUser)):
-                return await self.request('GET', f'/users/follows?first={limit}&from_id={_from.id}')
-            elif isinstance(_from, int) or to.isdigit():
-                return await self.request('GET', f'/users/follows?first={limit}&from_id={_from}')
+        return await self.request('GET', '/subscriptions', params=query, user=broadcaster,
+                                  scopes=(Scope.Channel.Subscriptions.read(),), priority=priority)
 
-    async def get_extension_transactions(self, extension, transaction, limit):
-        params = ''
+    async def send_whisper(self, sender, to, message, priority=Priority.Default):
+        # Sent on behalf of the sender, whose token needs the user:manage:whispers scope
+        query = Query()
+        query.identifiers(sender, 'from_user_id', types=USER_TYPES)
+        query.identifiers(to, 'to_user_id', types=USER_TYPES)
 
-        if not self._client.app_token:
-            raise TwitchException('Client method \'start\' was never called or coro was run before start')
+        return await self.request('POST', '/whispers', params=query, json={'message': message}, user=sender,
+                                  scopes=(Scope.Whispers.manage(),), priority=priority)
 
-        if isinstance(extension, Extension):
-            if extension.id != self._client_id:
-                raise TwitchException('Extension ID is not the same as the client ID')
+    async def get_follows(self, *, to=None, _from=None, limit, after=None, priority=Priority.Default):
+        if not to and not _from:
+            raise TwitchException('Either a followed or a following user is required')
 
-            params += f'?extension_id={extension.id}'
-        elif isinstance(extension, str):
-            if extension != self._client_id:
-                raise TwitchException('Extension ID is not the same as the client ID')
+        query = Query(('first', limit))
+        query.identifiers(to, 'to_id', types=USER_TYPES)
+        query.identifiers(_from, 'from_id', types=USER_TYPES)
+        query.add('after', after)
 
-            params += f'?extension_id={extension}'
+        return await self.request('GET', '/users/follows', params=query, priority=priority)
 
-        if isinstance(transaction, list):
-            for trans in transaction:
-                if isinstance(trans, Transaction):
-                    params += f'&id={trans.id}'
-                elif isinstance(trans, str):
-                    params += f'&id={trans}'
-        elif isinstance(transaction, str):
-            params += f'&id={transaction}'
+    async def get_extension_transactions(self, extension, transaction, limit, after=None, priority=Priority.Default):
+        extension_id = extension.id if isinstance(extension, Extension) else extension
+        if extension_id not in self.credentials:
+            raise TwitchException('Extension ID is not the same as the client ID')
 
-        params += f'&first={limit}'
+        query = Query(('extension_id', extension_id))
+        query.extend('id', [t.id if isinstance(t, Transaction) else t for t in as_list(transaction)])
+        query.add('first', limit)
+        query.add('after', after)
 
-        return await self.request('GET', f'/extensions/transactions{params}', headers={
-            'Authorization': f'Bearer {self._client.app_token}',
-        })
+        return await self.request('GET', '/extensions/transactions', params=query, priority=priority, client_id=extension_id)
 
     def is_closed(self):
-        return self._session.closed
+        return self.transport.closed
 
 
 class WSConnection(HTTPConnection):
-    def __init__(self, client, client_id, scopes, *, loop=None):
-        super().__init__(client, client_id, scopes, loop=loop)
+    def __init__(self, client, client_id, scopes, *, loop=None, transport=None):
+        super().__init__(client, client_id, scopes, loop=loop, transport=transport)
 
     async def irc_connect(self, channel, nick, oauth):
-        async with aiohttp.ClientSession() as session:
-            async with session.ws_connect('wss://irc-ws.chat.twitch.tv:443/') as ws:
-                logger.debug('IRC Connection started')
-                if oauth.startswith('oauth'):
-                    await ws.send_str(f'PASS {oauth}')
-                else:
-                    await ws.send_str(f'PASS oauth:{oauth}')
-
-                await ws.send_str(f'NICK {nick}')
-                await ws.send_str(f'JOIN #{channel}')
-
-                # required to send messages
-                await ws.send_str('CAP REQ :twitch.tv/membership')
-                # required to get full user info and use commands w/ tags
-                await ws.send_str(f'CAP REQ :twitch.tv/tags twitch.tv/commands')
-
-                while not self.loop.is_closed():
-                    res = (await ws.receive()).data.strip()
-                    print(res)
+        # Joins a single channel on a new chat client of the client, which closes it along with itself
+        chat = self._client.create_chat(nick, oauth)
+        await chat.join(channel)
+        return await chat.connect()
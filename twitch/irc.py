@@ -0,0 +1,120 @@
+import asyncio
+import logging
+
+import aiohttp
+
+
+logger = logging.getLogger(__name__)
+
+
+class WebSocketChatSocket:
+    """
+    Defines a chat connection over twitch's irc WebSocket endpoint
+    https://dev.twitch.tv/docs/irc/guide#connecting-to-twitch-irc
+
+    Each frame may carry several lines, they are split before being handed to the connection.
+    """
+
+    URL = 'wss://irc-ws.chat.twitch.tv:443/'
+
+    def __init__(self, transport, *, url=None):
+        self._transport = transport
+        self._url = url or self.URL
+        self._ws = None
+
+    def __repr__(self):
+        return f"<WebSocketChatSocket - url:{self._url} closed:{self.closed}>"
+
+    @property
+    def closed(self):
+        return self._ws is None or self._ws.closed
+
+    async def open(self):
+        self._ws = await self._transport.chat_session.ws_connect(self._url, autoping=True)
+
+    async def send(self, lines):
+        await self._ws.send_str('\r\n'.join(lines))
+
+    async def receive(self, timeout=None):
+        # Returns the lines of the next frame, or None once the socket is closed
+        msg = await self._ws.receive(timeout=timeout)
+
+        if msg.type == aiohttp.WSMsgType.TEXT:
+            return msg.data.split('\r\n')
+        elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED,
+                          aiohttp.WSMsgType.ERROR):
+            return None
+
+        # Binary frames are never sent by twitch, skip anything else
+        return []
+
+    async def close(self):
+        if self._ws is not None and not self._ws.closed:
+            try:
+                await self._ws.close()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.debug(f'Failed to close chat socket cleanly: {e!r}')
+
+
+class TCPChatSocket:
+    """
+    Defines a chat connection over a plain TCP socket, TLS encrypted by default
+    https://dev.twitch.tv/docs/irc/guide#connecting-to-twitch-irc
+
+    Lines are read in chunks as large as the socket hands them over, so a burst of messages is split and decoded at
+    once instead of going through a frame and a message object each.
+    """
+
+    HOST = 'irc.chat.twitch.tv'
+    PORT = 6697
+    CHUNK_SIZE = 65536
+
+    def __init__(self, transport=None, *, host=None, port=None, ssl=True):
+        # The transport is unused, it is accepted so both sockets are built the same way
+        self._host = host or self.HOST
+        self._port = port or (self.PORT if ssl else 6667)
+        self._ssl = ssl
+        self._reader = None
+        self._writer = None
+        self._buffer = b''
+
+    def __repr__(self):
+        return f"<TCPChatSocket - host:{self._host} port:{self._port} closed:{self.closed}>"
+
+    @property
+    def closed(self):
+        return self._writer is None or self._writer.is_closing()
+
+    async def open(self):
+        self._buffer = b''
+        self._reader, self._writer = await asyncio.open_connection(self._host, self._port, ssl=self._ssl or None,
+                                                                   limit=self.CHUNK_SIZE)
+
+    async def send(self, lines):
+        self._writer.write(''.join(line + '\r\n' for line in lines).encode())
+        await self._writer.drain()
+
+    async def receive(self, timeout=None):
+        # Returns the complete lines received so far, or None once the socket is closed
+        data = await asyncio.wait_for(self._reader.read(self.CHUNK_SIZE), timeout)
+        if not data:
+            return None
+
+        data = self._buffer + data if self._buffer else data
+        end = data.rfind(b'\n')
+
+        if end == -1:
+            self._buffer = data
+            return []
+
+        self._buffer = data[end + 1:]
+        # Twitch ends lines with \r\n, a lone \n is accepted as well
+        return data[:end].decode('utf-8', 'replace').replace('\r', '').split('\n')
+
+    async def close(self):
+        if self._writer is not None and not self._writer.is_closing():
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (OSError, asyncio.TimeoutError) as e:
+                logger.debug(f'Failed to close chat socket cleanly: {e!r}')
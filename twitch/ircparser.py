@@ -0,0 +1,231 @@
+from collections.abc import Mapping
+
+
+_ESCAPES = {':': ';', 's': ' ', '\\': '\\', 'r': '\r', 'n': '\n'}
+
+
+def unescape_tag(value):
+    # https://ircv3.net/specs/extensions/message-tags#escaping-values
+    i = value.find('\\')
+    if i == -1:
+        return value
+
+    ret = []
+    start = 0
+    while i != -1:
+        ret.append(value[start:i])
+        # A trailing lone backslash is dropped, unknown escapes keep the escaped character
+        escaped = value[i + 1:i + 2]
+        ret.append(_ESCAPES.get(escaped, escaped))
+        start = i + 2
+        i = value.find('\\', start)
+
+    ret.append(value[start:])
+    return ''.join(ret)
+
+
+class Tags(Mapping):
+    """
+    Defines the tags of a message as a read only mapping over the raw line
+
+    Looking up a tag only searches the line for its key and slices out its value, so a handler reading a few tags
+    never splits the others. Iterating or measuring the tags splits them once into their keys and raw values.
+    Values are unescaped when they are read, and only when they contain an escape.
+    """
+
+    __slots__ = ('_raw', '_start', '_end', '_values')
+
+    def __init__(self, raw, start=0, end=None):
+        self._raw = raw
+        self._start = start
+        self._end = len(raw) if end is None else end
+        self._values = None if start < self._end else {}
+
+    def __repr__(self):
+        return f"<Tags - {self._raw[self._start:self._end]}>"
+
+    def _split(self):
+        # Tags sent without a value read as an empty one
+        values = {}
+        for tag in self._raw[self._start:self._end].split(';'):
+            key, _, value = tag.partition('=')
+            values[key] = value
+
+        self._values = values
+        return values
+
+    def _find(self, key):
+        # Returns the raw value of a tag, or None when it is missing
+        values = self._values
+        if values is not None:
+            return values.get(key)
+
+        raw, start, end = self._raw, self._start, self._end
+        tokens = _TOKENS.get(key)
+        if tokens is None:
+            tokens = _TOKENS[key] = (';' + key + '=', key + '=')
+
+        # Separators are never escaped, so a key always follows a semicolon or starts the tags
+        pos = raw.find(tokens[0], start, end)
+        if pos != -1:
+            pos += len(tokens[0])
+        elif raw.startswith(tokens[1], start, end):
+            pos = start + len(tokens[1])
+        else:
+            # Missing, or sent without a value
+            return self._split().get(key)
+
+        stop = raw.find(';', pos, end)
+        return raw[pos:end if stop == -1 else stop]
+
+    def get(self, key, default=None):
+        value = self._find(key)
+        if value is None:
+            return default
+        return unescape_tag(value) if '\\' in value else value
+
+    def __getitem__(self, key):
+        values = self._values
+        if values is not None:
+            value = values[key]
+        else:
+            value = self._find(key)
+            if value is None:
+                raise KeyError(key)
+        return unescape_tag(value) if '\\' in value else value
+
+    def keys(self):
+        return (self._values if self._values is not None else self._split()).keys()
+
+    def __iter__(self):
+        return iter(self._values if self._values is not None else self._split())
+
+    def __len__(self):
+        return len(self._values if self._values is not None else self._split())
+
+
+# The search tokens of every tag looked up so far, twitch only sends a few dozen different ones
+_TOKENS = {}
+
+
+class Message:
+    """
+    Defines a single IRCv3 line as sent by twitch chat
+    https://ircv3.net/specs/extensions/message-tags
+
+    Only the command is sliced out when the line is parsed, which is all that is needed to route it. Tags, prefix and
+    parameters are located by their offsets into the line and sliced out the first time they are accessed.
+    """
+
+    __slots__ = ('raw', 'command', '_tags_end', '_prefix_end', '_params_start', '_tags', '_params')
+
+    def __init__(self, raw, command, tags_end, prefix_end, params_start):
+        self.raw = raw
+        self.command = command
+        self._tags_end = tags_end
+        self._prefix_end = prefix_end
+        self._params_start = params_start
+        self._tags = None
+        self._params = None
+
+    def __repr__(self):
+        return f"<Message - command:{self.command} params:{self.params}>"
+
+    def __str__(self):
+        return self.raw
+
+    @property
+    def tags(self):
+        if self._tags is None:
+            # The tags run from after the leading @ to the first space
+            self._tags = Tags(self.raw, 1, self._tags_end) if self._tags_end else Tags('')
+        return self._tags
+
+    @property
+    def prefix(self):
+        if not self._prefix_end:
+            return None
+
+        start = self._tags_end + 2 if self._tags_end else 1
+        return self.raw[start:self._prefix_end]
+
+    @property
+    def nick(self):
+        # The prefix is nick!user@host for users and the server name otherwise
+        if not self._prefix_end:
+            return None
+
+        raw = self.raw
+        start = self._tags_end + 2 if self._tags_end else 1
+        stop = raw.find('!', start, self._prefix_end)
+        return raw[start:self._prefix_end if stop == -1 else stop]
+
+    @property
+    def params(self):
+        if self._params is None:
+            line, separator, trailing = self.raw[self._params_start:].partition(' :')
+
+            if line.startswith(':'):
+                # The command is directly followed by the trailing parameter
+                params = [line[1:] + separator + trailing]
+            else:
+                params = line.split()
+                if separator:
+                    params.append(trailing)
+
+            self._params = params
+
+        return self._params
+
+    @property
+    def channel(self):
+        raw, start = self.raw, self._params_start
+
+        if not raw.startswith('#', start):
+            return None
+
+        stop = raw.find(' ', start)
+        return raw[start + 1:stop if stop != -1 else len(raw)]
+
+    @property
+    def trailing(self):
+        if self._params is None:
+            # Find the trailing parameter without splitting the others
+            raw, start = self.raw, self._params_start
+
+            if raw.startswith(':', start):
+                return raw[start + 1:]
+
+            pos = raw.find(' :', start)
+            if pos != -1:
+                return raw[pos + 2:]
+
+        params = self.params
+        return params[-1] if params else None
+
+
+def parse(line):
+    """
+    Parses a single line, without its line ending, into a Message
+    """
+    pos = 0
+    tags_end = prefix_end = 0
+    length = len(line)
+
+    if line.startswith('@'):
+        tags_end = line.find(' ')
+        if tags_end == -1:
+            tags_end = length
+        pos = tags_end + 1
+
+    if line.startswith(':', pos):
+        prefix_end = line.find(' ', pos)
+        if prefix_end == -1:
+            prefix_end = length
+        pos = prefix_end + 1
+
+    stop = line.find(' ', pos)
+    if stop == -1:
+        stop = length
+
+    return Message(line, line[pos:stop], tags_end, prefix_end, min(stop + 1, length))
@@ -0,0 +1,144 @@
+import asyncio
+import collections
+
+
+class PaginatedIterator:
+    """
+    Defines an async iterator over a cursor paginated helix endpoint
+    https://dev.twitch.tv/docs/api/guide#pagination
+
+    Pages are requested on demand and up to `prefetch` pages are fetched ahead in the background.
+    Model objects are only built for the page currently being consumed.
+    Awaiting the iterator instead of iterating it returns every item as a list.
+    Use it as an async context manager, or call `aclose`, to stop the background fetching when leaving a loop early.
+
+    A list of fetch functions can be given to walk several chunked queries one after the other,
+    the first pages of the chunks are then requested concurrently, as many as `limit` could still need.
+    """
+
+    def __init__(self, fetch, transform, *, limit=None, prefetch=1, page_size=100, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._sources = list(fetch) if type(fetch) in (tuple, list) else [fetch]
+        self._transform = transform
+        self._limit = limit
+        self._page_size = page_size
+        self._queue = asyncio.Queue(maxsize=max(prefetch, 1))
+        self._items = collections.deque()
+        self._task = None
+        self._yielded = 0
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    def __del__(self):
+        if self._task is not None and not self._task.done() and not self.loop.is_closed():
+            self._task.cancel()
+
+    def __await__(self):
+        return self.flatten().__await__()
+
+    async def __anext__(self):
+        if self._limit is not None and self._yielded >= self._limit:
+            await self.close()
+
+        while not self._items:
+            if self._done:
+                raise StopAsyncIteration
+
+            if self._task is None:
+                self._task = self.loop.create_task(_fill(self._sources, self._queue, self._limit, self._page_size,
+                                                         self.loop))
+
+            page = await self._queue.get()
+
+            if page is None:
+                self._done = True
+                raise StopAsyncIteration
+            elif isinstance(page, Exception):
+                self._done = True
+                raise page
+
+            self._items.extend(self._transform(data) for data in page)
+
+        self._yielded += 1
+        return self._items.popleft()
+
+    async def flatten(self):
+        ret = []
+
+        async for item in self:
+            ret.append(item)
+
+        return ret
+
+    async def close(self):
+        self._done = True
+        self._items.clear()
+
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def aclose(self):
+        await self.close()
+
+
+async def _fill(sources, queue, limit, page_size, loop):
+    # Kept apart from the iterator so the task holds no reference to it, an iterator abandoned mid loop is then
+    # freed right away and cancels the task instead of leaving it blocked on the queue
+    fetched = 0
+    heads = {}
+
+    def page_limit(fetched):
+        return page_size if limit is None else min(page_size, limit - fetched)
+
+    def request_heads(start):
+        # Only request as many chunks ahead as full pages could still be needed, every request costs rate limit budget
+        ahead = len(sources) if limit is None else -(-(limit - fetched) // page_size)
+
+        for i in range(start, min(start + ahead, len(sources))):
+            if i not in heads:
+                heads[i] = loop.create_task(sources[i](page_limit(fetched), None))
+
+    try:
+        for i, fetch in enumerate(sources):
+            if len(sources) > 1:
+                request_heads(i)
+
+            head = heads.pop(i, None)
+            data = await head if head else await fetch(page_limit(fetched), None)
+
+            while True:
+                page = data['data']
+                fetched += len(page)
+                await queue.put(page)
+
+                cursor = data.get('pagination', {}).get('cursor')
+                if not cursor or not page or (limit is not None and fetched >= limit):
+                    break
+
+                data = await fetch(page_limit(fetched), cursor)
+
+            if limit is not None and fetched >= limit:
+                break
+
+        await queue.put(None)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        await queue.put(e)
+    finally:
+        for head in heads.values():
+            if not head.done():
+                head.cancel()
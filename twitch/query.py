@@ -0,0 +1,76 @@
+from urllib.parse import urlencode
+
+
+def as_list(values):
+    if values is None:
+        return []
+    elif type(values) in (tuple, list, set, frozenset):
+        return list(values)
+    return [values]
+
+
+def classify(value, types=()):
+    """
+    Resolves a lookup value to a tuple of (is_id, value)
+
+    Objects of the given model types resolve to their id, ints are ids and strings are ids only when they are numeric
+    """
+    if types and isinstance(value, types):
+        return True, str(value.id)
+    elif isinstance(value, int):
+        return True, str(value)
+
+    value = str(value)
+    return value.isdigit(), value
+
+
+class Query:
+    """
+    Defines an ordered, url encoded helix query string
+    """
+
+    __slots__ = ('_params',)
+
+    def __init__(self, *params):
+        self._params = []
+
+        for key, value in params:
+            self.add(key, value)
+
+    def __str__(self):
+        return f'?{self.encode()}' if self._params else ''
+
+    def __repr__(self):
+        return f"<Query - {self.encode()}>"
+
+    def __len__(self):
+        return len(self._params)
+
+    def __iter__(self):
+        return iter(self._params)
+
+    @property
+    def params(self):
+        return self._params
+
+    @property
+    def key(self):
+        return tuple(sorted(self._params))
+
+    def add(self, key, value):
+        if value is not None and value != '':
+            self._params.append((key, str(value)))
+        return self
+
+    def extend(self, key, values):
+        self._params.extend((key, str(value)) for value in as_list(values) if value is not None and value != '')
+        return self
+
+    def identifiers(self, values, id_key, name_key=None, types=()):
+        for value in as_list(values):
+            is_id, value = classify(value, types)
+            self._params.append((id_key if is_id or name_key is None else name_key, value))
+        return self
+
+    def encode(self):
+        return urlencode(self._params)
@@ -0,0 +1,257 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class Priority:
+    """
+    Defines the priority classes helix requests are scheduled with
+    """
+
+    Interactive = 0  # Latency sensitive requests, e.g. answering a chat command
+    Default = 1  # Requests without a stated priority
+    Background = 2  # Bulk work that may only spend a share of the bucket, e.g. crawlers
+
+
+class RateLimiter:
+    """
+    Defines the client side view of a helix rate limit bucket
+    https://dev.twitch.tv/docs/api/guide#rate-limits
+
+    Every request reserves a point before it is sent, requests are queued while the bucket is exhausted
+    and released once the bucket resets. The bucket is kept in sync using the Ratelimit-* response headers.
+
+    Queued requests are released by priority, then in order of arrival. Background requests may only spend
+    `background_share` of the bucket, the rest stays reserved for interactive and default requests.
+
+    With a coordinator, each point is also reserved from a bucket shared by every process using the same `key`.
+    """
+
+    def __init__(self, *, limit=800, margin=0, period=60, background_share=0.5, coordinator=None, key=None, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._limit = limit
+        self._remaining = limit
+        self._reset_at = 0.0
+        self._margin = margin
+        self._period = period
+        self._background_share = background_share
+        self._pending = 0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._timer = None
+        self._coordinator = coordinator
+        self._key = key
+
+    def __repr__(self):
+        return f"<RateLimiter - limit:{self._limit} remaining:{self._remaining} pending:{self._pending} reset_at:{self._reset_at}>"
+
+    @property
+    def limit(self):
+        return self._limit
+
+    @property
+    def remaining(self):
+        return self._remaining
+
+    @property
+    def pending(self):
+        return self._pending
+
+    @property
+    def queued(self):
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    @property
+    def period(self):
+        return self._period
+
+    @property
+    def reset_at(self):
+        return self._reset_at
+
+    @property
+    def available(self):
+        self._refill()
+        return max(self._remaining - self._pending - self._margin, 0)
+
+    @property
+    def budget(self):
+        return {
+            'limit': self._limit,
+            'remaining': self._remaining,
+            'pending': self._pending,
+            'available': self.available,
+            'queued': self.queued,
+            'reset_at': self._reset_at,
+        }
+
+    def _refill(self):
+        if self._reset_at and time.time() >= self._reset_at:
+            self._remaining = self._limit
+            self._reset_at = 0.0
+
+    def _delay(self):
+        if self._reset_at:
+            return max(self._reset_at - time.time(), 0)
+
+        # Every point is in flight and no reset is known yet, wait for a response to tell us
+        return 0.05 if self._pending else self._period
+
+    def _admits(self, priority):
+        available = self.available
+
+        if priority == Priority.Background:
+            return available > self._limit * (1 - self._background_share)
+        return available > 0
+
+    async def acquire(self, priority=Priority.Default):
+        await self._acquire_local(priority)
+
+        if self._coordinator is not None:
+            try:
+                while True:
+                    wait = await self._coordinator.reserve(self._key, self._limit, self._period)
+                    if wait <= 0:
+                        break
+
+                    logger.debug(f'Shared rate limit for {self._key} exhausted, waiting {wait:.2f}s')
+                    await asyncio.sleep(wait)
+            except BaseException:
+                self.release()
+                raise
+
+    async def _acquire_local(self, priority):
+        if (not self._waiters or priority < self._waiters[0][0]) and self._admits(priority):
+            self._pending += 1
+            return
+
+        future = self.loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        self._wake()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The point was handed over just as the caller gave up, give it back
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def _wake(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            if not self._admits(priority):
+                delay = self._delay()
+                logger.debug(f'Rate limit exhausted, waiting {delay:.2f}s for the bucket to refill')
+                self._timer = self.loop.call_later(delay, self._wake)
+                return
+
+            heapq.heappop(self._waiters)
+            self._pending += 1
+            future.set_result(None)
+
+    def release(self, headers=None):
+        self._pending = max(self._pending - 1, 0)
+
+        if headers:
+            self.update(headers)
+
+        self._wake()
+
+    def update(self, headers):
+        try:
+            if 'Ratelimit-Limit' in headers:
+                self._limit = int(headers['Ratelimit-Limit'])
+            if 'Ratelimit-Remaining' in headers:
+                self._remaining = int(headers['Ratelimit-Remaining'])
+            if 'Ratelimit-Reset' in headers:
+                self._reset_at = float(headers['Ratelimit-Reset'])
+        except ValueError:
+            logger.warning(f'Received malformed rate limit headers: {dict(headers)}')
+            return
+
+        if self._coordinator is not None and 'Ratelimit-Remaining' in headers:
+            self.loop.create_task(self._coordinator.observe(self._key, self._limit, self._remaining,
+                                                            self._reset_at or time.time() + self._period))
+
+    def exhaust(self, reset_at=None):
+        self._remaining = 0
+        self._reset_at = reset_at or self._reset_at or time.time() + self._period
+
+
+class WindowLimiter:
+    """
+    Defines a limit of `limit` actions in any `period` seconds, e.g. the chat join and message limits
+    https://dev.twitch.tv/docs/irc/guide#rate-limits
+
+    Callers are served in order of arrival, each waiting until its actions fit in the sliding window.
+    """
+
+    def __init__(self, limit, period, *, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.limit = limit
+        self.period = period
+        self._sent = collections.deque()
+        self._lock = asyncio.Lock()
+
+    def __repr__(self):
+        return f"<WindowLimiter - limit:{self.limit} period:{self.period} used:{self.used}>"
+
+    def _prune(self, now):
+        while self._sent and self._sent[0] <= now - self.period:
+            self._sent.popleft()
+
+    @property
+    def used(self):
+        self._prune(time.monotonic())
+        return len(self._sent)
+
+    def delay(self, count=1):
+        now = time.monotonic()
+        self._prune(now)
+
+        excess = len(self._sent) + count - self.limit
+        if excess <= 0:
+            return 0.0
+        elif excess > len(self._sent):
+            # More actions than the whole window holds, wait for it to empty
+            return self._sent[-1] + self.period - now if self._sent else 0.0
+
+        return self._sent[excess - 1] + self.period - now
+
+    def try_acquire(self, count=1):
+        if self._lock.locked() or self.delay(count) > 0:
+            return False
+
+        self._sent.extend([time.monotonic()] * count)
+        return True
+
+    def refund(self, count=1):
+        # Hands back the most recently acquired actions, e.g. messages that could not be written after all
+        for _ in range(min(count, len(self._sent))):
+            self._sent.pop()
+
+    async def acquire(self, count=1):
+        async with self._lock:
+            while True:
+                delay = self.delay(count)
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+
+            self._sent.extend([time.monotonic()] * count)
@@ -0,0 +1,99 @@
+import random
+import time
+
+
+class RetryPolicy:
+    """
+    Defines how failed helix requests are retried
+
+    Only idempotent methods are retried after a server error or a connection failure, waiting an exponentially
+    growing, fully jittered delay between attempts. Rate limited requests are retried for any method.
+    """
+
+    def __init__(self, *, retries=3, backoff_base=0.5, backoff_cap=30, timeout=10, methods=('GET', 'HEAD', 'OPTIONS')):
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.methods = methods
+
+    def __repr__(self):
+        return f"<RetryPolicy - retries:{self.retries} base:{self.backoff_base} cap:{self.backoff_cap}>"
+
+    def can_retry(self, method, attempt, *, rate_limited=False):
+        if attempt >= self.retries:
+            return False
+        return rate_limited or method.upper() in self.methods
+
+    def backoff(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+        if retry_after is not None:
+            return max(delay, retry_after)
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Defines a circuit breaker guarding a single endpoint
+
+    After `threshold` consecutive failures the circuit opens and requests fail locally. Once `recovery_timeout`
+    seconds have passed a single trial request is let through, closing the circuit again if it succeeds. A trial that
+    is released without an outcome, or never reports back within `recovery_timeout`, lets another one through.
+    """
+
+    Closed = 'closed'
+    Open = 'open'
+    HalfOpen = 'half_open'
+
+    def __init__(self, *, threshold=5, recovery_timeout=30):
+        self._threshold = threshold
+        self._recovery_timeout = recovery_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_at = 0.0
+        self._state = CircuitBreaker.Closed
+
+    def __repr__(self):
+        return f"<CircuitBreaker - state:{self._state} failures:{self._failures}>"
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def retry_at(self):
+        return self._opened_at + self._recovery_timeout
+
+    @property
+    def retry_in(self):
+        return max(self.retry_at - time.monotonic(), 0)
+
+    def allow(self):
+        if self._state == CircuitBreaker.Closed:
+            return True
+
+        now = time.monotonic()
+        if self._state == CircuitBreaker.Open and now >= self.retry_at or \
+           self._state == CircuitBreaker.HalfOpen and now >= self._trial_at + self._recovery_timeout:
+            self._state = CircuitBreaker.HalfOpen
+            self._trial_at = now
+            return True
+
+        return False
+
+    def release(self):
+        # The trial ended without telling whether the endpoint recovered, let the next request try instead
+        if self._state == CircuitBreaker.HalfOpen:
+            self._state = CircuitBreaker.Open
+
+    def record_success(self):
+        self._failures = 0
+        self._state = CircuitBreaker.Closed
+
+    def record_failure(self):
+        self._failures += 1
+
+        if self._state == CircuitBreaker.HalfOpen or self._failures >= self._threshold:
+            self._state = CircuitBreaker.Open
+            self._opened_at = time.monotonic()
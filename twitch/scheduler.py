@@ -0,0 +1,174 @@
+import heapq
+import itertools
+import math
+import time
+
+
+class _Entry:
+    __slots__ = ('ema', 'last_change', 'last_poll', 'due', 'weight', 'token')
+
+    def __init__(self, now):
+        self.ema = None
+        self.last_change = now
+        self.last_poll = None
+        self.due = now
+        self.weight = 0.0
+        self.token = None
+
+
+class PollScheduler:
+    """
+    Defines an adaptive polling schedule for many keys sharing one request budget
+
+    Every key learns how often it changes as an exponential moving average of the time between two observed changes.
+    A key that has not changed for longer than its average is treated as changing that much less often. Keys then
+    split the budget of `rate` requests per second, `batch_size` keys each, in proportion to the square root of their
+    change rate, so hot keys are polled more often than cold ones without starving them. Intervals are kept
+    between `min_interval` and `max_interval`, equal bounds give every key the same fixed interval.
+
+    A request sent for overdue keys is topped up with the keys due next, since it costs the same either way.
+    """
+
+    def __init__(self, *, min_interval=60, max_interval=900, rate=1.0, batch_size=100, smoothing=0.3):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.batch_size = batch_size
+        self.smoothing = smoothing
+        self._rate = rate
+        self._entries = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._weights = 0.0
+
+    def __repr__(self):
+        return f"<PollScheduler - keys:{len(self._entries)} rate:{self.rate:.2f} min_interval:{self.min_interval} max_interval:{self.max_interval}>"
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    @property
+    def rate(self):
+        # The budget may be given as a callable, e.g. to follow the rate limit of the client
+        return self._rate() if callable(self._rate) else self._rate
+
+    @rate.setter
+    def rate(self, value):
+        self._rate = value
+
+    @property
+    def adaptive(self):
+        return self.max_interval > self.min_interval
+
+    def add(self, key, now=None):
+        if key in self._entries:
+            return
+
+        now = time.time() if now is None else now
+        entry = self._entries[key] = _Entry(now)
+        self._reweigh(entry, now)
+        self._push(key, entry)
+
+    def remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._weights -= entry.weight
+
+    def expected_change(self, key, now=None):
+        # Seconds between two changes of the key as far as we can tell
+        entry = self._entries[key]
+        now = time.time() if now is None else now
+        return max(entry.ema or 0.0, now - entry.last_change, self.min_interval)
+
+    def interval(self, key, now=None):
+        if not self.adaptive:
+            return self.min_interval
+
+        entry = self._entries[key]
+        capacity = self.rate * self.batch_size
+        if capacity <= 0 or entry.weight <= 0:
+            return self.max_interval
+
+        # Polling frequency proportional to sqrt(change rate), scaled so every key together spends the whole budget
+        return min(max(self._weights / (capacity * entry.weight), self.min_interval), self.max_interval)
+
+    def record(self, key, changed, now=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+
+        now = time.time() if now is None else now
+        entry.last_poll = now
+
+        if changed:
+            gap = now - entry.last_change
+            entry.ema = gap if entry.ema is None else self.smoothing * gap + (1 - self.smoothing) * entry.ema
+            entry.last_change = now
+
+        self._reweigh(entry, now)
+        entry.due = now + self.interval(key, now)
+        self._push(key, entry)
+
+    def next_batch(self, now=None):
+        """
+        Returns a tuple of (keys, wait), the keys to poll now or the seconds until the next key is due
+        """
+        now = time.time() if now is None else now
+        self._prune()
+        top = self._peek()
+
+        if top is None:
+            return [], self.max_interval
+        elif top[0] > now:
+            return [], top[0] - now
+
+        keys = []
+        while self._heap and len(keys) < self.batch_size:
+            _, token, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+
+            if entry is None or entry.token != token:
+                continue
+
+            keys.append(key)
+
+        # Until the poll is recorded, assume it happened so a failed request does not retry in a tight loop
+        for key in keys:
+            entry = self._entries[key]
+            entry.due = now + self.interval(key, now)
+            self._push(key, entry)
+
+        return keys, 0.0
+
+    def _reweigh(self, entry, now):
+        weight = math.sqrt(1 / max(entry.ema or 0.0, now - entry.last_change, self.min_interval))
+        self._weights += weight - entry.weight
+        entry.weight = weight
+
+    def _push(self, key, entry):
+        # Only the latest push of a key is live, older heap entries are skipped when popped
+        entry.token = next(self._counter)
+        heapq.heappush(self._heap, (entry.due, entry.token, key))
+
+    def _peek(self):
+        while self._heap:
+            _, token, key = self._heap[0]
+            entry = self._entries.get(key)
+
+            if entry is not None and entry.token == token:
+                return self._heap[0]
+
+            heapq.heappop(self._heap)
+
+        return None
+
+    def _prune(self):
+        # Each reschedule leaves a stale heap entry behind, drop them before they outnumber the live ones
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(entry.due, entry.token, key) for key, entry in self._entries.items()]
+            heapq.heapify(self._heap)
@@ -81,6 +81,7 @@ class Scope:
         """
         _readonly = 'whispers:read'
         _sendonly = 'whispers:edit'
+        _manage = 'user:manage:whispers'
 
         @classmethod
         def read(cls):
@@ -90,6 +91,10 @@ class Scope:
         def send(cls):
             return cls._sendonly
 
+        @classmethod
+        def manage(cls):
+            return cls._manage
+
     class Clips:
         """
         Defines the clips scopes
@@ -0,0 +1,281 @@
+import asyncio
+import collections
+import logging
+
+from .ratelimit import WindowLimiter
+
+
+logger = logging.getLogger(__name__)
+
+
+class ChatLimits:
+    """
+    Defines the message limits of one chat account, shared by every connection it sends on
+    https://dev.twitch.tv/docs/irc/guide#rate-limits
+
+    Every message counts against `mod_message_limit`, messages to channels where the account is neither moderator nor
+    broadcaster also count against the lower `message_limit`.
+    """
+
+    def __init__(self, *, message_limit=20, mod_message_limit=100, message_period=30, loop=None):
+        self.messages = WindowLimiter(message_limit, message_period, loop=loop)
+        self.mod_messages = WindowLimiter(mod_message_limit, message_period, loop=loop)
+
+    def __repr__(self):
+        return f"<ChatLimits - messages:{self.messages.used} mod_messages:{self.mod_messages.used}>"
+
+
+class _Item:
+    __slots__ = ('target', 'line', 'key', 'queued_at', 'future', 'last_sent')
+
+    def __init__(self, target, line, key, queued_at, future):
+        self.target = target
+        self.line = line
+        self.key = key
+        self.queued_at = queued_at
+        self.future = future
+        # When the target was last written to before this line, restored if writing it fails
+        self.last_sent = None
+
+
+class SendQueue:
+    """
+    Defines the outbound queue of a chat connection
+
+    Lines are written once they fit the account's limits and, for channels in slow mode where the account is not
+    privileged, once the channel's slow delay has passed since the last message to it. Everything that fits is written
+    to the socket in one go, up to `batch_size` lines. Lines to the same target keep their order.
+
+    Lines that waited longer than `max_age` seconds are dropped, as the chat has moved on by then, and so is the
+    oldest line once more than `max_size` are queued. A line queued with a `key` replaces the unsent line with the same
+    target and key. Every line resolves to True once written and to False when it was dropped or replaced.
+    """
+
+    def __init__(self, connection, limits, *, max_size=100, max_age=30, batch_size=20, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.max_size = max_size
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self._connection = connection
+        self._limits = limits
+        self._items = collections.deque()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._moderated = {}
+        self._exempt = {}
+        self._slow = {}
+        self._last_sent = {}
+        self.sent = 0
+        self.dropped = 0
+
+    def __repr__(self):
+        return f"<SendQueue - depth:{self.depth} sent:{self.sent} dropped:{self.dropped}>"
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def depth(self):
+        return len(self._items)
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = self.loop.create_task(self._run())
+        return self
+
+    def wake(self):
+        self._wakeup.set()
+
+    def observe(self, message):
+        # Keeps track of the chat settings and our own badges, from ROOMSTATE and USERSTATE
+        channel = message.channel
+        tags = message.tags
+
+        if message.command == 'ROOMSTATE':
+            # Only the changed settings are sent after the first ROOMSTATE
+            slow = tags.get('slow')
+            if slow:
+                self._slow[channel] = int(slow)
+        elif message.command == 'USERSTATE':
+            badges = tags.get('badges') or ''
+            self._moderated[channel] = tags.get('mod') == '1' or 'broadcaster/' in badges
+            self._exempt[channel] = self._moderated[channel] or 'vip/' in badges
+
+        self.wake()
+
+    def is_moderated(self, channel):
+        return self._moderated.get(channel, False)
+
+    def put(self, channel, content, *, key=None):
+        line = f'PRIVMSG #{channel} :{content}'
+        future = self.loop.create_future()
+        item = _Item(channel, line, key, self.loop.time(), future)
+
+        if key is not None:
+            for queued in self._items:
+                if queued.key == key and queued.target == channel:
+                    # The new line takes the place in line of the one it replaces, but is as old as it is
+                    self._resolve(queued.future, False)
+                    self.dropped += 1
+                    queued.line, queued.future, queued.queued_at = line, future, item.queued_at
+                    return future
+
+        self._items.append(item)
+
+        while len(self._items) > self.max_size:
+            dropped = self._items.popleft()
+            logger.debug(f'Send queue is full, dropping {dropped.line!r}')
+            self._resolve(dropped.future, False)
+            self.dropped += 1
+
+        self.wake()
+        return future
+
+    def drain(self):
+        # Stops writing and hands back every queued line, e.g. to move them to another connection
+        self.stop()
+        items, self._items = list(self._items), collections.deque()
+        return items
+
+    def requeue(self, items):
+        for item in items:
+            if not item.future.done():
+                self._items.append(item)
+        self.wake()
+
+    def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    def close(self):
+        self.stop()
+
+        for item in self._items:
+            self._resolve(item.future, False)
+        self._items.clear()
+
+    @staticmethod
+    def _resolve(future, result):
+        if not future.done():
+            future.set_result(result)
+
+    def _expire(self, now):
+        if not self.max_age:
+            return
+
+        # Replaced lines keep their place in line, so the oldest line is not necessarily the first one
+        if not any(now - item.queued_at > self.max_age for item in self._items):
+            return
+
+        kept = collections.deque()
+        for item in self._items:
+            if now - item.queued_at > self.max_age:
+                logger.debug(f'Dropping {item.line!r} after {now - item.queued_at:.1f}s in the send queue')
+                self._resolve(item.future, False)
+                self.dropped += 1
+            else:
+                kept.append(item)
+
+        self._items = kept
+
+    def _limiters(self, item):
+        if self._moderated.get(item.target):
+            return self._limits.mod_messages,
+        return self._limits.messages, self._limits.mod_messages
+
+    def _delay(self, item, now):
+        delay = max(limiter.delay() for limiter in self._limiters(item))
+
+        if not self._exempt.get(item.target):
+            slow = self._slow.get(item.target)
+            last = self._last_sent.get(item.target)
+            if slow and last is not None:
+                delay = max(delay, last + slow - now)
+
+        return delay
+
+    def _take(self, now):
+        # Returns the lines that can be written now, and otherwise the seconds until the next one can
+        batch = []
+        blocked = set()
+        kept = collections.deque()
+        wait = None
+
+        for item in self._items:
+            if item.future.done():
+                continue
+            elif len(batch) >= self.batch_size or item.target in blocked:
+                kept.append(item)
+                continue
+
+            delay = self._delay(item, now)
+            if delay > 0:
+                blocked.add(item.target)
+                kept.append(item)
+                wait = delay if wait is None else min(wait, delay)
+                continue
+
+            # Taken right away so the rest of the batch counts them, handed back by _write if writing fails
+            for limiter in self._limiters(item):
+                limiter.try_acquire()
+            item.last_sent = self._last_sent.get(item.target)
+            self._last_sent[item.target] = now
+            batch.append(item)
+
+        self._items = kept
+        return batch, wait
+
+    async def _run(self):
+        while True:
+            now = self.loop.time()
+            self._expire(now)
+            wait = None
+
+            if self._items and not self._connection.ready:
+                # Wake up in time to drop what goes stale while the connection is down
+                wait = min(item.queued_at for item in self._items) + self.max_age - now if self.max_age else None
+            elif self._items:
+                batch, wait = self._take(now)
+
+                if batch:
+                    await self._write(batch)
+                    continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _write(self, batch):
+        try:
+            await self._connection._socket.send([item.line for item in batch])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The connection is about to reconnect, try again once it is back
+            logger.debug(f'Failed to write {len(batch)} chat lines: {e!r}')
+            self._refund(batch)
+            self._items.extendleft(reversed(batch))
+            await asyncio.sleep(1)
+            return
+
+        self.sent += len(batch)
+        for item in batch:
+            self._resolve(item.future, True)
+
+    def _refund(self, batch):
+        # Nothing was written, so nothing counts against the limits or the slow mode delays
+        for item in reversed(batch):
+            for limiter in self._limiters(item):
+                limiter.refund()
+
+            if item.last_sent is None:
+                self._last_sent.pop(item.target, None)
+            else:
+                self._last_sent[item.target] = item.last_sent
@@ -0,0 +1,44 @@
+import asyncio
+import concurrent.futures
+import sqlite3
+
+
+class SQLiteDatabase:
+    """
+    Defines a sqlite file shared by the persistent backends, with every statement run off the event loop
+
+    sqlite connections are not thread safe, so the connection is only used from a single worker thread and coroutines
+    await their calls there through `run`. The file uses a WAL journal so other processes can read while one writes.
+    """
+
+    def __init__(self, path, *schema, timeout=5, isolation_level='', loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._path = path
+        self._closed = False
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=isolation_level, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+
+        for statement in schema:
+            self.connection.execute(statement)
+        self.connection.commit()
+
+    def __repr__(self):
+        return f"<SQLiteDatabase - path:{self._path} closed:{self._closed}>"
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def closed(self):
+        return self._closed
+
+    async def run(self, func, *args):
+        return await self.loop.run_in_executor(self._executor, func, *args)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._executor.shutdown(wait=True)
+            self.connection.close()
@@ -10,12 +10,14 @@ class Stream(ChatChannel):
     """
     Defines a twitch stream
     """
-    __slots__ = ('_client', '_id', '_broadcaster', '_game', '_is_live', '_title', '_viewer_count', '_started_at', '_language', '_format_thumbnail_url', '_tags')
+    __slots__ = ('_client', '_id', '_broadcaster', '_login', '_game', '_is_live', '_title', '_viewer_count', '_started_at', '_language', '_format_thumbnail_url', '_tags')
 
     def __init__(self, client, data):
         self._client = client
         self._id = data['id']
-        self._broadcaster = PartialUser(data['user_id'], data['user_name'])
+        self._broadcaster = PartialUser(client, data['user_id'], data['user_name'])
+        # user_name is the display name, which may differ from the login beyond its case
+        self._login = data['user_login']
         self._game = PartialGame(data['game_id'])
         self._is_live = True if data['type'] == 'live' else False
         self._title = data['title']
@@ -54,6 +56,10 @@ class Stream(ChatChannel):
     def broadcaster(self):
         return self._broadcaster
 
+    @property
+    def login(self):
+        return self._login
+
     @property
     def game(self):
         return self._game
@@ -88,12 +94,12 @@ class Stream(ChatChannel):
 
     async def fetch_streamer(self):
         if not isinstance(self._broadcaster, User):
-            self._broadcaster = await self._broadcaster.fetch_user()
+            self._broadcaster = await self._broadcaster.fetch_user() or self._broadcaster
         return self._broadcaster
 
     async def fetch_game(self):
         if not isinstance(self._game, Game):
-            self._game = await self._game.fetch_game()
+            self._game = await self._client.get_game(self._game.id) or self._game
         return self._game
 
     async def fetch_tags(self):
@@ -124,13 +130,11 @@ class Stream(ChatChannel):
         streamer = await self.fetch_streamer()
         return await streamer.update_metadata()
 
-    async def get_followers(self):
-        streamer = await self.fetch_streamer()
-        return streamer.get_followers()
+    def get_followers(self, limit: int = 20, prefetch: int = 1):
+        return self._client.get_followers(self._broadcaster, limit, prefetch)
 
-    async def get_following(self):
-        streamer = await self.fetch_streamer()
-        return streamer.get_following()
+    def get_following(self, limit: int = 20, prefetch: int = 1):
+        return self._client.get_followings(self._broadcaster, limit, prefetch)
 
     async def get_clips(self):
         streamer = await self.fetch_streamer()
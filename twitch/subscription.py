@@ -28,9 +28,9 @@ class Subscription:
 
     __slots__ = ('_broadcaster', '_subscriber', '_is_gift', '_tier', '_name')
 
-    def __init__(self, data):
-        self._broadcaster = PartialUser(data['broadcaster_id'], data['broadcaster_name'])
-        self._subscriber = PartialUser(data['user_id'], data['user_name'])
+    def __init__(self, client, data):
+        self._broadcaster = PartialUser(client, data['broadcaster_id'], data['broadcaster_name'])
+        self._subscriber = PartialUser(client, data['user_id'], data['user_name'])
         self._is_gift = data['is_gift']
         self._tier = SubscriptionType.ensure_type(data['tier'])
         self._name = data['plan_name']
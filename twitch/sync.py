@@ -0,0 +1,157 @@
+import asyncio
+import inspect
+import logging
+import threading
+
+from .client import Twitch
+from .iterators import PaginatedIterator
+
+
+logger = logging.getLogger(__name__)
+
+
+class SyncMethod:
+    """
+    Defines the blocking and future returning variants of a client method
+
+    Calling it blocks the calling thread until the result is ready, `future` returns a concurrent.futures.Future instead.
+    Methods returning a paginated iterator resolve to the list of every item.
+    """
+
+    __slots__ = ('_client', '_name')
+
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+
+    def __repr__(self):
+        return f"<SyncMethod - {self._name}>"
+
+    def __call__(self, *args, **kwargs):
+        return self.future(*args, **kwargs).result(self._client.timeout)
+
+    def future(self, *args, **kwargs):
+        return self._client.submit(self._call(*args, **kwargs))
+
+    async def _call(self, *args, **kwargs):
+        # The method itself runs on the loop thread too, iterators and tasks are bound to the loop they are created on
+        result = getattr(self._client.client, self._name)(*args, **kwargs)
+
+        if isinstance(result, PaginatedIterator):
+            return await result.flatten()
+        elif inspect.isawaitable(result):
+            return await result
+        return result
+
+
+class SyncTwitch:
+    """
+    Defines a synchronous facade over Twitch for threaded applications, e.g. Django or Flask
+
+    The event loop runs in a dedicated daemon thread and every call is submitted to it, so any number of threads share
+    one connection pool, rate limiter and cache. Every coroutine method of Twitch is exposed as a blocking call,
+    with a `future` variant returning a concurrent.futures.Future, e.g.
+
+        client = SyncTwitch(client_id, client_secret)
+        user = client.get_user('dovedevic')
+        futures = [client.get_stream.future(name) for name in names]
+        client.close()
+    """
+
+    def __init__(self, client_id, client_secret, *, timeout=None, **kwargs):
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='twitch-loop', daemon=True)
+        self._thread.start()
+
+        async def create():
+            return Twitch(client_id, client_secret, loop=self.loop, handle_signals=False, **kwargs)
+
+        self.client = self.submit(create()).result()
+
+    def __repr__(self):
+        return f"<SyncTwitch - thread:{self._thread.name} closed:{self._closed}>"
+
+    def __getattr__(self, name):
+        # Only reached for names SyncTwitch does not define itself
+        if name == 'client':
+            raise AttributeError(name)
+
+        attr = getattr(self.client, name)
+
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        return SyncMethod(self, name)
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()) | {name for name in dir(self.client) if not name.startswith('_')})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def submit(self, coro):
+        if self._closed:
+            raise RuntimeError('SyncTwitch is closed')
+        elif threading.current_thread() is self._thread:
+            # Blocking on the loop thread would wait on itself forever
+            raise RuntimeError('SyncTwitch cannot be called from its own event loop, await the client directly instead')
+
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        # Run any coroutine on the client's loop, e.g. methods of the model objects the client returned
+        return self.submit(coro).result(timeout if timeout is not None else self.timeout)
+
+    def iterate(self, name, *args, **kwargs):
+        # Yield the items of a paginated method page by page instead of collecting them into a list
+        iterator = self.run(self._create(name, *args, **kwargs))
+
+        try:
+            while True:
+                try:
+                    yield self.run(iterator.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            if not self._closed:
+                self.run(iterator.close())
+
+    async def _create(self, name, *args, **kwargs):
+        return getattr(self.client, name)(*args, **kwargs)
+
+    async def _cancel_tasks(self):
+        tasks = [task for task in asyncio.all_tasks(self.loop) if task is not asyncio.current_task()]
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        if self._closed:
+            return
+
+        try:
+            self.run(self.client.shutdown())
+            self.run(self._cancel_tasks())
+        except Exception as e:
+            logger.warning(f'Failed to shut down the client cleanly: {e!r}')
+        finally:
+            self._closed = True
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+
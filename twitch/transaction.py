@@ -41,11 +41,11 @@ class Transaction:
 
     __slots__ = ('_id', '_timestamp', '_to_user', '_from_user', '_product_type', '_sku', '_cost_amount', '_cost_type', '_product_name', '_product_in_development')
 
-    def __init__(self, data):
+    def __init__(self, client, data):
         self._id = data['id']
         self._timestamp = get_datetime_from(data['timestamp'], '%Y-%m-%dT%H:%M:%S.%fZ')
-        self._to_user = PartialUser(data['broadcaster_id'], data['broadcaster_name'])
-        self._from_user = PartialUser(data['user_id'], data['user_name'])
+        self._to_user = PartialUser(client, data['broadcaster_id'], data['broadcaster_name'])
+        self._from_user = PartialUser(client, data['user_id'], data['user_name'])
         self._product_type = TwitchProductType.ensure_type(data['product_type'])
         self._sku = data['product_data']['sku']
         self._cost_amount = data['product_data']['cost']['amount']
@@ -0,0 +1,102 @@
+import aiohttp
+import aiohttp.abc
+import asyncio
+import socket
+import ssl
+
+
+class _SharedDNSCache(aiohttp.abc.AbstractResolver):
+    """
+    Defines a resolver caching lookups for every connector of a transport, so helix and chat resolve each host once
+    """
+
+    def __init__(self, ttl, *, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._ttl = ttl
+        self._resolver = None
+        self._hosts = {}
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        key = (host, port, family)
+        cached = self._hosts.get(key)
+
+        if cached is not None and (self._ttl is None or self.loop.time() < cached[0]):
+            return cached[1]
+
+        if self._resolver is None:
+            self._resolver = aiohttp.DefaultResolver()
+
+        hosts = await self._resolver.resolve(host, port, family)
+        self._hosts[key] = (self.loop.time() + (self._ttl or 0), hosts)
+        return hosts
+
+    async def close(self):
+        self._hosts.clear()
+        if self._resolver is not None:
+            await self._resolver.close()
+            self._resolver = None
+
+
+class Transport:
+    """
+    Defines the connection pool shared by helix and irc traffic
+
+    A single tuned connector and session are created lazily and can be handed to several clients,
+    so every HTTP request reuses the same keep-alive connections, DNS cache and TLS context.
+
+    Chat WebSockets hold their connection for as long as they are open, so they are given a connector of their own
+    sharing the DNS cache and TLS context. They never count against `limit`, which is left to helix requests.
+    """
+
+    def __init__(self, *, limit=100, limit_per_host=0, keepalive_timeout=60, ttl_dns_cache=300, ssl_context=None, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._ttl_dns_cache = ttl_dns_cache
+        self._ssl_context = ssl_context or ssl.create_default_context()
+        self._resolver = _SharedDNSCache(ttl_dns_cache, loop=self.loop)
+        self._connector = None
+        self._session = None
+        self._chat_session = None
+        self._closed = False
+
+    def __repr__(self):
+        return f"<Transport - limit:{self._limit} limit_per_host:{self._limit_per_host} closed:{self.closed}>"
+
+    @property
+    def connector(self):
+        if self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(limit=self._limit, limit_per_host=self._limit_per_host,
+                                                   keepalive_timeout=self._keepalive_timeout,
+                                                   resolver=self._resolver, use_dns_cache=False,
+                                                   ssl=self._ssl_context)
+        return self._connector
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(connector=self.connector)
+        return self._session
+
+    @property
+    def chat_session(self):
+        # Unlimited, every chat connection is a single long lived WebSocket
+        if self._chat_session is None or self._chat_session.closed:
+            connector = aiohttp.TCPConnector(limit=0, resolver=self._resolver, use_dns_cache=False, ssl=self._ssl_context)
+            self._chat_session = aiohttp.ClientSession(connector=connector)
+        return self._chat_session
+
+    @property
+    def closed(self):
+        return self._closed
+
+    async def close(self):
+        self._closed = True
+
+        # The sessions own their connectors and close them along with themselves
+        for session in (self._session, self._chat_session):
+            if session and not session.closed:
+                await session.close()
+
+        await self._resolver.close()
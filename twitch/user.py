@@ -221,11 +221,11 @@ class User(WhisperChannel):
         # TODO:: Insert client integration here. something like return await client.update_user_extensions(self, extensions)
         pass
 
-    async def get_followers(self, limit: int = 20):
-        return await self._client.get_followers(self, limit)
+    def get_followers(self, limit: int = 20, prefetch: int = 1):
+        return self._client.get_followers(self, limit, prefetch)
 
-    async def get_following(self, limit: int = 20):
-        return await self._client.get_followings(self, limit)
+    def get_following(self, limit: int = 20, prefetch: int = 1):
+        return self._client.get_followings(self, limit, prefetch)
 
     async def get_clips(self):
         # TODO:: Insert client integration here. something like return await client.get_clips(self)
@@ -0,0 +1,410 @@
+import asyncio
+import json
+import logging
+
+from .errors import TwitchException
+from .events import EventDispatcher
+from .follower import Follower
+from .genericutils import chunks
+from .query import as_list, classify
+from .ratelimit import Priority
+from .scheduler import PollScheduler
+from .sqlite import SQLiteDatabase
+from .stream import Stream
+from .user import User, PartialUser, BannedPartialUser
+
+
+logger = logging.getLogger(__name__)
+
+
+def channel_key(user):
+    if isinstance(user, Stream):
+        user = user.broadcaster
+
+    is_id, value = classify(user, (User, PartialUser, BannedPartialUser))
+    return value if is_id else value.lower()
+
+
+class Watcher(EventDispatcher):
+    """
+    Defines the polling loop shared by the watchers
+
+    Keys are polled `batch_size` at a time as a PollScheduler decides, spending at most `budget` of the client's rate
+    limits. Subclasses implement `poll` and report whether each key changed to the scheduler.
+    """
+
+    def __init__(self, client, *, interval=60, max_interval=None, budget=0.5, batch_size=100, priority=Priority.Background,
+                 loop=None):
+        super().__init__(loop=loop or client.loop)
+        self._client = client
+        self._budget = budget
+        self._priority = priority
+        self.scheduler = PollScheduler(min_interval=interval, max_interval=max_interval or interval, rate=self._rate,
+                                       batch_size=batch_size)
+        self._task = None
+        self.polls = 0
+        self.errors = 0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def _rate(self):
+        # Requests per second the watcher may spend, its share of every credential's bucket
+        limit = sum(credential.ratelimit.limit for credential in self._client.credentials)
+        return limit * self._budget / self._client.ratelimit.period
+
+    def start(self):
+        if not self.running:
+            self._task = self.loop.create_task(self._run())
+        return self
+
+    def stop(self):
+        if self.running:
+            self._task.cancel()
+        self._task = None
+
+    def close(self):
+        # Stops for good, unlike stop the watcher cannot be started again
+        self.stop()
+
+    async def _run(self):
+        while True:
+            keys, wait = self.scheduler.next_batch()
+
+            if not keys:
+                # Wake up regularly anyway so newly added keys are picked up quickly
+                await asyncio.sleep(min(wait, 1.0))
+                continue
+
+            started = self.loop.time()
+            await self.poll(keys)
+
+            rate = self._rate()
+            await asyncio.sleep(max(1 / rate - (self.loop.time() - started), 0) if rate > 0 else 1.0)
+
+    async def poll(self, keys=None):
+        raise NotImplementedError
+
+
+class StreamWatcher(Watcher):
+    """
+    Defines a poller detecting when watched channels go live, go offline or change
+    https://dev.twitch.tv/docs/api/reference#get-streams
+
+    Channels are polled 100 per request by a PollScheduler, spending at most `budget` of the client's rate limits.
+    With `max_interval` above `interval` each channel is polled between the two, more often the more often it goes
+    live, goes offline or changes title or game. Otherwise every channel is polled each `interval` seconds.
+    Each snapshot is compared to the previous one and dispatched as events:
+
+        on_stream_online(stream)
+        on_stream_offline(stream), with the last seen stream
+        on_stream_update(before, after), when the title, game or viewer count changed
+
+    The first snapshot of a channel only records its state unless `initial_events` is set.
+    """
+
+    def __init__(self, client, users=None, *, interval=60, max_interval=None, budget=0.5, priority=Priority.Background,
+                 initial_events=False, loop=None):
+        super().__init__(client, interval=interval, max_interval=max_interval, budget=budget, batch_size=100,
+                         priority=priority, loop=loop)
+        self._initial_events = initial_events
+        self._channels = {}
+        self._live = {}
+
+        self.add(*as_list(users))
+
+    def __repr__(self):
+        return f"<StreamWatcher - channels:{len(self._channels)} live:{len(self._live)} rate:{self._rate():.2f}>"
+
+    @property
+    def channels(self):
+        return list(self._channels)
+
+    @property
+    def live(self):
+        return dict(self._live)
+
+    def add(self, *users):
+        for user in users:
+            key = channel_key(user)
+            self._channels.setdefault(key, False)
+            self.scheduler.add(key)
+
+    def remove(self, *users):
+        for user in users:
+            key = channel_key(user)
+            self._channels.pop(key, None)
+            self._live.pop(key, None)
+            self.scheduler.remove(key)
+
+    async def poll(self, keys=None):
+        # Poll the given channels once, or every channel when none are given, and dispatch what changed
+        keys = list(self._channels) if keys is None else [channel_key(key) for key in keys]
+
+        for batch in chunks(keys):
+            try:
+                data = await self._client.http.get_streams(batch, None, None, 100, priority=self._priority)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep the last known state, a failed poll says nothing about the channels in it
+                self.errors += 1
+                logger.warning(f'Failed to poll {len(batch)} channels: {e!r}')
+                continue
+
+            self.polls += 1
+            found = {}
+            for item in data['data']:
+                stream = Stream(self._client, item)
+                found[item['user_id']] = found[item['user_login']] = stream
+
+            for key in batch:
+                if key in self._channels:
+                    self.scheduler.record(key, self._diff(key, found.get(key)))
+
+    def _diff(self, key, stream):
+        # Returns whether the channel changed state, viewer counts alone change too often to tell hot channels apart
+        before = self._live.get(key)
+        initial = not self._channels[key]
+        self._channels[key] = True
+
+        if stream is None:
+            self._live.pop(key, None)
+        else:
+            self._live[key] = stream
+
+        if initial:
+            if self._initial_events and stream is not None:
+                self.dispatch('stream_online', stream)
+            return False
+
+        if before is None and stream is None:
+            return False
+        elif before is None:
+            self.dispatch('stream_online', stream)
+        elif stream is None:
+            self.dispatch('stream_offline', before)
+        elif before.id != stream.id:
+            # The channel restarted its stream between two polls
+            self.dispatch('stream_offline', before)
+            self.dispatch('stream_online', stream)
+        elif (before.title, before.game.id) != (stream.title, stream.game.id):
+            self.dispatch('stream_update', before, stream)
+        else:
+            if before.viewer_count != stream.viewer_count:
+                self.dispatch('stream_update', before, stream)
+            return False
+
+        return True
+
+
+class MemoryCheckpointBackend:
+    """
+    Defines the default follower checkpoint backend, keeping every checkpoint in process
+
+    A checkpoint is a plain dict of the mark's `followed_at` and `ids`, other backends load, save and delete it by the
+    broadcaster's id and are closed along with the watcher
+    """
+
+    def __init__(self):
+        self._checkpoints = {}
+
+    async def load(self, user_id):
+        return self._checkpoints.get(user_id)
+
+    async def save(self, user_id, checkpoint):
+        self._checkpoints[user_id] = checkpoint
+
+    async def delete(self, user_id):
+        self._checkpoints.pop(user_id, None)
+
+    def close(self):
+        pass
+
+
+class SQLiteCheckpointBackend:
+    """
+    Defines a persistent sqlite store of follower checkpoints, so a restarted process resumes where it stopped
+    """
+
+    def __init__(self, path, *, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._path = path
+        self._sqlite = SQLiteDatabase(path, 'CREATE TABLE IF NOT EXISTS follow_checkpoints ('
+                                            'user_id TEXT PRIMARY KEY, data TEXT NOT NULL)', loop=self.loop)
+        self._db = self._sqlite.connection
+
+    def __repr__(self):
+        return f"<SQLiteCheckpointBackend - path:{self._path}>"
+
+    def _load(self, user_id):
+        row = self._db.execute('SELECT data FROM follow_checkpoints WHERE user_id = ?', (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, user_id, checkpoint):
+        self._db.execute('INSERT OR REPLACE INTO follow_checkpoints (user_id, data) VALUES (?, ?)',
+                         (user_id, json.dumps(checkpoint)))
+        self._db.commit()
+
+    def _delete(self, user_id):
+        self._db.execute('DELETE FROM follow_checkpoints WHERE user_id = ?', (user_id,))
+        self._db.commit()
+
+    async def load(self, user_id):
+        return await self._sqlite.run(self._load, user_id)
+
+    async def save(self, user_id, checkpoint):
+        await self._sqlite.run(self._save, user_id, checkpoint)
+
+    async def delete(self, user_id):
+        await self._sqlite.run(self._delete, user_id)
+
+    def close(self):
+        self._sqlite.close()
+
+
+class FollowerWatcher(Watcher):
+    """
+    Defines an incremental sync of the followers of many broadcasters
+    https://dev.twitch.tv/docs/api/reference#get-users-follows
+
+    Follows are paged newest first and paging stops at the high-water mark stored for the broadcaster, the
+    `followed_at` of the newest follow seen so far along with the followers sharing that timestamp. Only follows
+    past the mark are dispatched, oldest first:
+
+        on_follow(follower)
+
+    A broadcaster with a few new follows per poll therefore costs a single request. Checkpoints are kept in the
+    `checkpoints` backend, the first sync of a broadcaster without one only records the mark unless `backfill` is set.
+    Broadcasters are polled one per request by a PollScheduler, more often the more often they gain followers.
+    """
+
+    def __init__(self, client, users=None, *, interval=60, max_interval=None, budget=0.25, priority=Priority.Background,
+                 checkpoints=None, backfill=False, max_pages=10, loop=None):
+        super().__init__(client, interval=interval, max_interval=max_interval, budget=budget, batch_size=1,
+                         priority=priority, loop=loop)
+        self._checkpoints = checkpoints or MemoryCheckpointBackend()
+        self._backfill = backfill
+        self._max_pages = max_pages
+        self._syncing = {}
+
+        self.add(*as_list(users))
+
+    def __repr__(self):
+        return f"<FollowerWatcher - broadcasters:{len(self.scheduler)} rate:{self._rate():.2f}>"
+
+    @property
+    def checkpoints(self):
+        return self._checkpoints
+
+    def close(self):
+        super().close()
+
+        for task in list(self._syncing.values()):
+            task.cancel()
+        self._checkpoints.close()
+
+    @property
+    def broadcasters(self):
+        return list(self.scheduler)
+
+    def add(self, *users):
+        for user in users:
+            self.scheduler.add(channel_key(user))
+
+    def remove(self, *users):
+        for user in users:
+            self.scheduler.remove(channel_key(user))
+
+    async def poll(self, keys=None):
+        keys = self.broadcasters if keys is None else [channel_key(key) for key in keys]
+
+        for key in keys:
+            try:
+                followers = await self.sync(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f'Failed to sync followers of {key}: {e!r}')
+                continue
+
+            self.scheduler.record(key, bool(followers))
+
+    async def sync(self, user):
+        # Collapse concurrent syncs of one broadcaster, two could both advance the mark past what the other emitted
+        key = channel_key(user)
+
+        task = self._syncing.get(key)
+        if task is None:
+            task = self._syncing[key] = self.loop.create_task(self._sync(key))
+            task.add_done_callback(lambda _: self._syncing.pop(key, None))
+
+        return await asyncio.shield(task)
+
+    async def _sync(self, key):
+        user_id = key
+        if not key.isdigit():
+            user = await self._client.get_user(key, priority=self._priority)
+            if user is None:
+                raise TwitchException(f'No user named {key}')
+            user_id = str(user.id)
+
+        checkpoint = await self._checkpoints.load(user_id)
+        new = []
+        after = None
+
+        for _ in range(self._max_pages):
+            data = await self._client.http.get_follows(to=user_id, limit=100, after=after, priority=self._priority)
+            self.polls += 1
+            page = data['data']
+
+            reached = False
+            for item in page:
+                if checkpoint is not None and self._reached(item, checkpoint):
+                    reached = True
+                    break
+                new.append(item)
+
+            after = data.get('pagination', {}).get('cursor')
+
+            # Without a checkpoint the first page is enough to place the mark
+            if reached or not page or not after or (checkpoint is None and not self._backfill):
+                break
+        else:
+            logger.warning(f'Stopped syncing followers of {user_id} after {self._max_pages} pages, older follows are skipped')
+
+        if new or checkpoint is None:
+            await self._checkpoints.save(user_id, self._advance(checkpoint, new))
+
+        if checkpoint is None and not self._backfill:
+            return []
+
+        followers = [Follower(self._client, item) for item in reversed(new)]
+        for follower in followers:
+            self.dispatch('follow', follower)
+
+        return followers
+
+    @staticmethod
+    def _reached(item, checkpoint):
+        followed_at = checkpoint['followed_at']
+
+        if followed_at is None:
+            return False
+        # Helix timestamps share one format, so they compare correctly as strings
+        return item['followed_at'] < followed_at or (item['followed_at'] == followed_at and item['from_id'] in checkpoint['ids'])
+
+    @staticmethod
+    def _advance(checkpoint, new):
+        if not new:
+            return checkpoint or {'followed_at': None, 'ids': []}
+
+        followed_at = new[0]['followed_at']
+        ids = {item['from_id'] for item in new if item['followed_at'] == followed_at}
+
+        if checkpoint is not None and checkpoint['followed_at'] == followed_at:
+            ids.update(checkpoint['ids'])
+
+        return {'followed_at': followed_at, 'ids': sorted(ids)}